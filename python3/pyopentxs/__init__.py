@@ -1,16 +1,55 @@
-import opentxs
 from contextlib import closing
+import functools
 import os
 import sys
+import threading
+import time
+
+# PYOPENTXS_BACKEND=simulated replaces the opentxs module with an
+# in-memory stand-in, see pyopentxs/simulated.py
+backend = os.environ.get('PYOPENTXS_BACKEND', 'opentxs')
+if backend == 'simulated':
+    from pyopentxs import simulated
+    sys.modules['opentxs'] = simulated
+import opentxs  # noqa: E402
+
+
+class _LazyOTME:
+    '''Stands in for the OT_ME object, which is created on first use'''
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = opentxs.OT_ME()
+        return getattr(self._instance, name)
 
 
 # OTME = OpenTransactions MadeEasy
-otme = opentxs.OT_ME()
+otme = _LazyOTME()
 
 # The directory where OT stores its state
 config_dir = os.environ['HOME'] + "/.ot/"
 
 
+def set_home(home):
+    '''Keep the OT state in home/.ot instead of $HOME/.ot, e.g. to run
+       several isolated clients and notaries on one machine.  OT finds
+       its directory through $HOME, so this changes the environment of
+       this process and the processes it starts.  Must be called before
+       init().'''
+    global config_dir
+    os.environ['HOME'] = home
+    config_dir = os.path.join(home, ".ot/")
+
+
+if 'PYOPENTXS_HOME' in os.environ:
+    set_home(os.environ['PYOPENTXS_HOME'])
+
+
 class ReturnValueError(BaseException):
     """
     The return value of an API function has signaled an error condition
@@ -54,6 +93,26 @@ def decode(stream):
     return decoded
 
 
+def file_version(path):
+    '''Return (mtime, size) of the file, which changes when it's rewritten'''
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# keyed by the file version too, so a rewritten file is decoded again and
+# its stale contents drop out of the cache as it fills up
+@functools.lru_cache(maxsize=64)
+def _decode_version(path, version):
+    with open(path, encoding="utf-8") as f:
+        return opentxs.OTAPI_Wrap_Decode(f.read(), True)
+
+
+def decode_file(path):
+    '''decode() the file at path.  The result is kept until the file
+       changes, so decoding the same file again is free.'''
+    return _decode_version(path, file_version(path))
+
+
 def is_message_success(message):
     '''Returns true if message has success=true'''
     if message == '':
@@ -62,6 +121,22 @@ def is_message_success(message):
         return opentxs.OTAPI_Wrap_Message_GetSuccess(message) == 1
 
 
+_nym_locks = {}
+_nym_locks_guard = threading.Lock()
+
+# serializes the calls that write the client wallet, like creating a nym
+# or adding a contract, against each other and against loading it
+wallet_lock = threading.RLock()
+
+
+def nym_lock(server_id, nym_id):
+    '''Return the lock that serializes the requests of a nym to a server.
+       OT keeps a request number per (server, nym), so requests of the
+       same nym must not interleave when running in several threads.'''
+    with _nym_locks_guard:
+        return _nym_locks.setdefault((server_id, nym_id), threading.RLock())
+
+
 def _remove_pid():
     """
     Remove the PID file if one exists
@@ -70,21 +145,51 @@ def _remove_pid():
     # There should not be a long-running opentxs client running anyway.
     # An existing PID file probably indicates a crashed process, not a running
     # instance
-    pid_file = os.path.expanduser("~/.ot/client_data/ot.pid")
+    pid_file = config_dir + "client_data/ot.pid"
     if os.path.exists(pid_file):
         print("removing lockfile %s" % pid_file, file=sys.stderr)
         os.remove(pid_file)
 
 
-def init():
+# what init() has done in this process: None, "initialized" (the OT API)
+# or "loaded" (and the wallet)
+state = None
+# seconds the last AppInit and LoadWallet took
+init_seconds = {}
+_init_lock = threading.RLock()
+
+
+def init(reload=False):
     """
-    Initialize the OTAPI in order to get a working state
+    Initialize the OTAPI in order to get a working state.  Only the first
+    call does anything, unless reload is true, which loads the wallet
+    again, e.g. after its files were replaced.
     """
-    # This should only be done once per process.
-    _remove_pid()
-    opentxs.OTAPI_Wrap_AppInit()
-    opentxs.OTAPI_Wrap_LoadWallet()
+    global state
+    with _init_lock:
+        if state == "loaded" and not reload:
+            return
+        from pyopentxs import nym, server, wallet
+        if state is None:
+            # This should only be done once per process.
+            _remove_pid()
+            start = time.perf_counter()
+            opentxs.OTAPI_Wrap_AppInit()
+            init_seconds["AppInit"] = time.perf_counter() - start
+            state = "initialized"
+        with wallet_lock:
+            start = time.perf_counter()
+            opentxs.OTAPI_Wrap_LoadWallet()
+            init_seconds["LoadWallet"] = time.perf_counter() - start
+            state = "loaded"
+            # the wallet may have changed
+            server.invalidate()
+            wallet.index.invalidate()
+            nym.pool.clear()
 
 
 def cleanup():
-    opentxs.OTAPI_Wrap_AppCleanup()
+    global state
+    with _init_lock:
+        opentxs.OTAPI_Wrap_AppCleanup()
+        state = None
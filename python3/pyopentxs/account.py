@@ -2,32 +2,83 @@ from pyopentxs import ReturnValueError
 from pyopentxs.nym import Nym
 import opentxs
 
-from bs4 import BeautifulSoup
-from pyopentxs import otme
+from pyopentxs import message, otme, nym_lock, wallet
+from concurrent.futures import ThreadPoolExecutor
 import re
+import time
+
+# account id -> time the account was last downloaded from the server,
+# used by the balance cache
+_fetched = {}
 
 
 class Account:
-    def __init__(self, asset=None, nym=None, server_id=None, _id=None):
-        self.server_id = server_id or (asset and asset.server_id)
-        self.nym = nym or Nym().register()
-        self.asset = asset
+    '''An asset account.  Only the ids are needed to construct one, anything
+       else is looked up on first use: the nym, asset and server of an
+       existing account (with _id) from the wallet, and for a new account
+       without a nym, a new nym is registered when one is needed.'''
+
+    def __init__(self, asset=None, nym=None, server_id=None, _id=None, max_age=None):
+        self._server_id = server_id or (asset and asset.server_id)
+        self._nym = nym
+        self._asset = asset
         self._id = _id
+        # seconds a downloaded balance may be served from the local wallet,
+        # None disables the balance cache
+        self.max_age = max_age
+
+    def _info(self):
+        return self._id and wallet.index.account(self._id)
+
+    @property
+    def server_id(self):
+        if not self._server_id:
+            info = self._info()
+            self._server_id = info and info.server_id
+        return self._server_id
+
+    @server_id.setter
+    def server_id(self, server_id):
+        self._server_id = server_id
+
+    @property
+    def nym(self):
+        if self._nym is None:
+            info = self._info()
+            if info:
+                self._nym = Nym(server_id=info.server_id, _id=info.nym_id)
+            elif self._id:
+                raise ValueError("Account {} is not in the wallet".format(self._id))
+            else:
+                self._nym = Nym().register(self.server_id)
+        return self._nym
+
+    @nym.setter
+    def nym(self, nym):
+        self._nym = nym
+
+    @property
+    def asset(self):
+        if self._asset is None:
+            info = self._info()
+            if info:
+                from pyopentxs.asset import Asset
+                self._asset = Asset(server_id=info.server_id, _id=info.asset_id)
+        return self._asset
+
+    @asset.setter
+    def asset(self, asset):
+        self._asset = asset
 
     def create(self):
         if self._id:
             raise ValueError("Can't create the same account twice,\
             to create an account of the same type, create a new Account object first.")
         account_xml = otme.create_asset_acct(self.server_id, self.nym._id, self.asset._id)
-        s = BeautifulSoup(account_xml)
-        # new message name
-        if s.registeraccountresponse:
-            self._id = s.registeraccountresponse['accountid']
-            return self
-            
-        # todo: old message name, remove in due time.
-        if s.createaccountresponse:
-            self._id = s.createaccountresponse['accountid']
+        reply = message.account_reply(account_xml)
+        if reply and reply.account_id:
+            self._id = reply.account_id
+            wallet.index.account_changed(self._id)
             return self
 
         raise ReturnValueError("No account id present in response, account not created.")
@@ -35,32 +86,75 @@ class Account:
     def delete(self):
         deleted = opentxs.OTAPI_Wrap_deleteAssetAccount(self.server_id, self.nym._id, self._id)
         print("deleting {} returned {}".format(self._id, deleted))
+        invalidate(self)
+        if deleted > 0:
+            wallet.index.account_removed(self._id)
         assert deleted > 0, "Unable to delete account {}, return code {}".format(self._id, deleted)
 
-    def balance(self):
+    def refresh(self):
         """
-        refresh local account files from server and return account balance
+        refresh local account files from server
         """
         assert self._id, "Account must be created first."
-        
+
         if hasattr(opentxs, 'OTAPI_Wrap_getAccountData'): # new api name
             res = opentxs.OTAPI_Wrap_getAccountData(self.server_id, self.nym._id, self._id)
         else: # todo: old api name, remove in due time
             res = opentxs.OTAPI_Wrap_getAccountFiles(self.server_id, self.nym._id, self._id)
         if res < 0:
             raise ReturnValueError(res)
+        _fetched[self._id] = time.monotonic()
+        return self
+
+    def balance(self):
+        """
+        Return the account balance.  The local account files are refreshed
+        from the server first, unless the balance cache is enabled (max_age
+        is set), the last refresh is at most max_age seconds old and no
+        operation has invalidated the account since.
+        """
+        assert self._id, "Account must be created first."
+
+        fetched = _fetched.get(self._id)
+        if self.max_age is None or fetched is None or time.monotonic() - fetched > self.max_age:
+            self.refresh()
         return opentxs.OTAPI_Wrap_GetAccountWallet_Balance(self._id)
 
     def __repr__(self):
+        # without triggering any lookups
         return "<Account id={}, asset={}, nym={}, server_id={}>".format(
-            self._id, self.asset, self.nym, self.server_id)
+            self._id, self._asset, self._nym, self._server_id)
 
 
-def get_all_ids():
-    account_count = opentxs.OTAPI_Wrap_GetAccountCount()
-    accounts = []
-    for i in range(account_count):
-        _id = opentxs.OTAPI_Wrap_GetAccountWallet_ID(i)
-        accounts.append(_id)
+def balances(accounts, workers=8):
+    '''Return a dict of account id -> balance for the given accounts, each
+       refreshed from the server regardless of the balance cache.  The
+       downloads of accounts owned by different nyms (or on different
+       servers) run concurrently, those of the same nym one after another.'''
+    groups = {}
+    for account in accounts:
+        groups.setdefault((account.server_id, account.nym._id), []).append(account)
 
-    return accounts
+    def fetch(key, group):
+        with nym_lock(*key):
+            return [(account._id,
+                     opentxs.OTAPI_Wrap_GetAccountWallet_Balance(account.refresh()._id))
+                    for account in group]
+
+    result = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch, key, group) for key, group in groups.items()]
+        for future in futures:
+            result.update(future.result())
+    return result
+
+
+def invalidate(*accounts):
+    '''Mark the cached balances of the given accounts (Account objects or
+       ids) as stale, so that the next balance() refreshes from the server'''
+    for account in accounts:
+        _fetched.pop(getattr(account, '_id', account), None)
+
+
+def get_all_ids():
+    return wallet.index.account_ids()
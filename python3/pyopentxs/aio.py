@@ -0,0 +1,109 @@
+"""asyncio versions of the pyopentxs operations.  The blocking OT calls
+run in the threads of a dedicated worker.  Requests of the same nym to
+the same server run one after another, under the same nym_lock as the
+blocking API, since OT numbers them, while those of different nyms run
+concurrently.  A worker can be used from any event loop.
+
+Usage:
+from pyopentxs import aio
+nym = await aio.register(Nym())
+acct = await aio.create_account(Account(asset, nym))
+await aio.transfer(10, issuer_account, acct)
+print(await aio.balance(acct))
+"""
+
+from pyopentxs import nym_lock, server
+from pyopentxs import instrument
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+
+
+class Worker:
+    '''Runs OT calls in its own threads, serialized per (server id, nym id)'''
+
+    def __init__(self, threads=4):
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+
+    async def run(self, keys, f, *args):
+        '''Run f(*args) in a worker thread, holding the nym_lock of each of
+           the (server id, nym id) keys'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor,
+                                          functools.partial(_locked, keys, f, *args))
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+# the worker used by the functions below
+worker = Worker()
+
+
+def _locked(keys, f, *args):
+    # take the locks in a fixed order so two calls can't wait on each other
+    locks = [nym_lock(*key) for key in sorted(set(keys))]
+    for lock in locks:
+        lock.acquire()
+    try:
+        return f(*args)
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+
+def _key(server_id, nym):
+    return (server_id, nym._id)
+
+
+async def register(nym, server_id=None):
+    '''Nym.register()'''
+    server_id = server_id or nym.server_id or server.first_active_id()
+    if not nym._id:
+        # creating the keys doesn't involve a server
+        await worker.run([], nym.create)
+    return await worker.run([_key(server_id, nym)], nym.register, server_id)
+
+
+async def create_account(account):
+    '''Account.create(), which registers a new nym if the account has none'''
+    if account._nym is None:
+        # resolving the nym may register one, a round trip
+        await worker.run([], lambda: account.nym)
+    return await worker.run([_key(account.server_id, account.nym)], account.create)
+
+
+async def balance(account):
+    '''Account.balance()'''
+    return await worker.run([_key(account.server_id, account.nym)], account.balance)
+
+
+async def transfer(item, source_acct, target_acct):
+    '''instrument.transfer(), which needs both the source and target nym'''
+    keys = [_key(source_acct.server_id, source_acct.nym),
+            _key(target_acct.server_id, target_acct.nym)]
+    return await worker.run(keys, instrument.transfer, item, source_acct, target_acct)
+
+
+async def write_cheque(cheque):
+    '''Cheque.write()'''
+    return await worker.run([_key(cheque.server_id, cheque.sender_nym)], cheque.write)
+
+
+async def deposit_cheque(cheque, depositor_nym, depositor_account):
+    '''Cheque.deposit(), which writes the cheque first if necessary'''
+    keys = [_key(cheque.server_id, depositor_nym)]
+    if not cheque._body:
+        keys.append(_key(cheque.server_id, cheque.sender_nym))
+    return await worker.run(keys, cheque.deposit, depositor_nym, depositor_account)
+
+
+async def withdraw_voucher(voucher):
+    '''Voucher.withdraw()'''
+    return await worker.run([_key(voucher.server_id, voucher.sender_nym)], voucher.withdraw)
+
+
+async def deposit_voucher(voucher, depositor_nym, depositor_account):
+    '''Voucher.deposit()'''
+    return await worker.run([_key(voucher.server_id, depositor_nym)],
+                            voucher.deposit, depositor_nym, depositor_account)
@@ -1,5 +1,5 @@
 import opentxs
-from pyopentxs import is_message_success, otme, server
+from pyopentxs import is_message_success, otme, server, wallet
 from pyopentxs.account import Account
 
 
@@ -7,10 +7,12 @@ class Asset:
     def __init__(self, server_id=None, _id=None):
         self.server_id = server_id
         self._id = _id
+        self.issuer = None
 
     def create_contract(self, nym, contract_stream):
         asset_id = opentxs.OTAPI_Wrap_CreateAssetContract(nym._id, contract_stream.read())
         assert asset_id
+        wallet.index.asset_changed(asset_id)
         self.issuer = nym
         self._id = asset_id
 
@@ -34,6 +36,7 @@ class Asset:
                                         signed_contract)
         assert is_message_success(message)
         account_id = opentxs.OTAPI_Wrap_Message_GetNewIssuerAcctID(message)
+        wallet.index.account_changed(account_id)
         self.issuer_account = Account(asset=self, nym=self.issuer, server_id=self.server_id,
                                       _id=account_id)
         return self
@@ -47,11 +50,5 @@ def get_all():
     """
     Returns an array of assets described as tuples(id, name)
     """
-    asset_count = opentxs.OTAPI_Wrap_GetAssetTypeCount()
-    assets = []
-    for i in range(asset_count):
-        asset_id = opentxs.OTAPI_Wrap_GetAssetType_ID(i)
-        asset_name = opentxs.OTAPI_Wrap_GetAssetType_Name(asset_id)
-        assets.append([asset_id, asset_name])
-
-    return assets
+    return [[asset_id, wallet.index.asset_name(asset_id)]
+            for asset_id in wallet.index.asset_ids()]
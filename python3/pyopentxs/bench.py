@@ -0,0 +1,234 @@
+"""Load generator for the payment flows: direct transfers, cheques and
+vouchers, as done by instrument.transfer().  Runs either closed loop
+(every worker starts its next payment when the previous one is done) or
+open loop at a target rate, and reports throughput and latency
+percentiles per flow.  In open loop at most one payment per account
+pair is in flight; a payment that comes due while all pairs are busy is
+dropped and counted, so a notary that falls behind doesn't pile up work
+past the end of the run.  Needs a running notary, like the tests.
+
+Usage:
+python3 -m pyopentxs.bench --mix transfer=2,cheque=1,voucher=1 --concurrency 8 \\
+    --duration 60 --output results.json
+python3 -m pyopentxs.bench --rate 20 --duration 60 --compare results.json
+"""
+
+import pyopentxs
+from pyopentxs import ReturnValueError, instrument, provision
+from pyopentxs.asset import Asset
+from pyopentxs.nym import Nym
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import json
+import opentxs
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+contract_file = os.path.join(os.path.dirname(__file__), "../../test-data/sample-contracts/btc.xml")
+
+# the flows and the instrument each one transfers
+FLOWS = ["transfer", "cheque", "voucher"]
+
+
+def make_instrument(flow, source, target, amount):
+    if flow == "transfer":
+        return amount
+    if flow == "cheque":
+        now = datetime.utcnow()
+        return instrument.Cheque(source.server_id, amount, now - timedelta(0, 1000),
+                                 now + timedelta(0, 1000), source, source.nym, "bench", target.nym)
+    if flow == "voucher":
+        return instrument.Voucher(source.server_id, amount, source, source.nym, "bench",
+                                  target.nym)
+    raise ValueError("Unknown flow {}".format(flow))
+
+
+def parse_mix(mix):
+    '''Parse "transfer=2,cheque=1" into {"transfer": 2, "cheque": 1}'''
+    weights = {}
+    for part in mix.split(","):
+        flow, _, weight = part.partition("=")
+        if flow not in FLOWS:
+            raise ValueError("Unknown flow {}, must be one of {}".format(flow, FLOWS))
+        weights[flow] = float(weight or 1)
+    return weights
+
+
+def percentile(values, p):
+    '''Nearest-rank percentile of sorted values'''
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+
+class Recorder:
+    '''Collects the latency of every payment per flow, and the number of
+       failed and dropped payments'''
+
+    def __init__(self):
+        self.latencies = dict((flow, []) for flow in FLOWS)
+        self.errors = dict((flow, 0) for flow in FLOWS)
+        self.dropped = dict((flow, 0) for flow in FLOWS)
+        self._lock = threading.Lock()
+
+    def record(self, flow, latency, ok):
+        with self._lock:
+            if ok:
+                self.latencies[flow].append(latency)
+            else:
+                self.errors[flow] += 1
+
+    def drop(self, flow):
+        with self._lock:
+            self.dropped[flow] += 1
+
+    def report(self, elapsed):
+        flows = {}
+        for flow in FLOWS:
+            values = sorted(self.latencies[flow])
+            if not values and not self.errors[flow] and not self.dropped[flow]:
+                continue
+            flows[flow] = {
+                "ops": len(values),
+                "errors": self.errors[flow],
+                "dropped": self.dropped[flow],
+                "ops_per_sec": len(values) / elapsed,
+                "mean": sum(values) / len(values) if values else None,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+        return flows
+
+
+def setup_pairs(count, balance):
+    '''Issue an asset and return count (source, target) account pairs, the
+       sources funded with balance'''
+    asset = Asset().issue(Nym().register(), open(contract_file))
+    rows = provision.provision(2 * count, [asset], {})
+    failed = provision.failed(rows)
+    assert not failed, "Unable to set up accounts: {}".format(failed[0].error)
+    accounts = [row.accounts[asset._id] for row in rows]
+    sources, targets = accounts[:count], accounts[count:]
+    for source in sources:
+        instrument.transfer(balance, asset.issuer_account, source)
+    return list(zip(sources, targets))
+
+
+def _pay(recorder, flow, pair, amount, scheduled):
+    source, target = pair
+    try:
+        instrument.transfer(make_instrument(flow, source, target, amount), source, target)
+        ok = True
+    except (Exception, ReturnValueError) as e:
+        print("{} failed: {}".format(flow, e), file=sys.stderr)
+        ok = False
+    # measured from when the payment was due, so that queueing counts in open loop
+    recorder.record(flow, time.perf_counter() - scheduled, ok)
+
+
+def run(weights, pairs, duration, rate=None, amount=1, seed=None):
+    '''Run payments for duration seconds, closed loop with one worker per
+       pair or open loop at rate payments per second.  Returns the report
+       dict per flow.'''
+    rng = random.Random(seed)
+    flows = list(weights)
+
+    def choose():
+        return rng.choices(flows, [weights[f] for f in flows])[0]
+
+    recorder = Recorder()
+    # open loop payments in flight, at most one per pair
+    in_flight = threading.BoundedSemaphore(len(pairs))
+    free = queue.Queue()
+    for pair in pairs:
+        free.put(pair)
+    start = time.perf_counter()
+    end = start + duration
+
+    def closed_loop():
+        pair = free.get()
+        while time.perf_counter() < end:
+            _pay(recorder, choose(), pair, amount, time.perf_counter())
+
+    def open_loop_payment(flow, scheduled):
+        # a pair is free, as only as many payments as pairs are in flight
+        pair = free.get()
+        try:
+            _pay(recorder, flow, pair, amount, scheduled)
+        finally:
+            free.put(pair)
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=len(pairs)) as executor:
+        if rate:
+            due = start
+            while due < end:
+                time.sleep(max(0, due - time.perf_counter()))
+                flow = choose()
+                if in_flight.acquire(blocking=False):
+                    executor.submit(open_loop_payment, flow, due)
+                else:
+                    recorder.drop(flow)
+                due += 1.0 / rate
+        else:
+            for _ in pairs:
+                executor.submit(closed_loop)
+    return recorder.report(time.perf_counter() - start)
+
+
+def compare(current, previous):
+    '''Return lines comparing the flows of two result documents'''
+    lines = []
+    for flow, now in sorted(current["flows"].items()):
+        before = previous["flows"].get(flow)
+        if not before:
+            continue
+        for metric in ["ops_per_sec", "p50", "p95", "p99"]:
+            if now[metric] and before[metric]:
+                lines.append("{} {}: {:.4g} -> {:.4g} ({:+.1f}%)".format(
+                    flow, metric, before[metric], now[metric],
+                    100.0 * (now[metric] - before[metric]) / before[metric]))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the payment flows against a notary.")
+    parser.add_argument("--mix", default="transfer=1,cheque=1,voucher=1",
+                        help="flows and their weights, e.g. transfer=2,cheque=1")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="number of account pairs paying concurrently")
+    parser.add_argument("--rate", type=float, help="payments per second (open loop), "
+                        "by default every pair pays again as soon as it's done")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--seed", type=int, help="seed for picking the flows")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results in this JSON file")
+    args = parser.parse_args(argv)
+
+    weights = parse_mix(args.mix)
+    pyopentxs.init()
+    pairs = setup_pairs(args.concurrency, 10 ** 12)
+    result = {
+        "date": datetime.utcnow().isoformat(),
+        "opentxs": opentxs.__file__,
+        "config": vars(args),
+        "flows": run(weights, pairs, args.duration, args.rate, seed=args.seed),
+    }
+    print(json.dumps(result["flows"], indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(result, json.load(f))))
+    pyopentxs.cleanup()
+
+
+if __name__ == "__main__":
+    main()
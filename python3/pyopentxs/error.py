@@ -21,8 +21,11 @@ with error.expected('foo'):
 
 from contextlib import contextmanager
 import re
-from multimethods import singledispatch
-from collections import Callable
+from functools import singledispatch
+try:
+    from collections.abc import Callable
+except ImportError:  # python < 3.3
+    from collections import Callable
 
 
 @singledispatch
@@ -31,20 +34,20 @@ def match(o, e):
     raise NotImplementedError("Don't know how to match {} to an error".format(o))
 
 
-@match.method(type)
+@match.register(type)
 def _exception(cls_e, e):
     """Simulates normal except: clauses by matching the exception type"""
     return isinstance(e, cls_e)
 
 
-@match.method(Callable)
+@match.register(Callable)
 def _callable(f, e):
     """Pass the exception to the callable, if the callable returns truthy,
     then it's a match."""
     return f(e)
 
 
-@match.method(type(None))
+@match.register(type(None))
 def _none(f, e):
     # if we're expecting "None" (no error) then any error is non-matching.
     return False
@@ -56,7 +59,7 @@ def regex(expr, e):
     return p.search(str(e.message))
 
 
-@match.method(str)
+@match.register(str)
 def _str(s, e):
     """Treat string as a regex and match it against the Exception's
     message."""
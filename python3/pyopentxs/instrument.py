@@ -1,7 +1,8 @@
-from pyopentxs import ReturnValueError, is_message_success, otme, server
+from pyopentxs import (ReturnValueError, is_message_success, otme, server, account, transnum,
+                       outpayments)
 import opentxs
 from datetime import datetime
-from multimethods import singledispatch
+from functools import singledispatch
 
 
 class Cheque:
@@ -22,7 +23,7 @@ class Cheque:
         Prepare cheque
         valid_from and valid_to are datetime objects
         """
-        otme.make_sure_enough_trans_nums(10, self.server_id, self.sender_nym._id)
+        transnum.reserve(self.server_id, self.sender_nym._id)
 
         secs_since_1970 = lambda d: int((d - datetime(1970, 1, 1)).total_seconds())
         self._body = opentxs.OTAPI_Wrap_WriteCheque(
@@ -45,25 +46,17 @@ class Cheque:
         '''
         if not self._body:
             self.write()
+        transnum.reserve(self.server_id, depositor_nym._id)
         result = otme.deposit_cheque(self.server_id, depositor_nym._id,
                                      depositor_account._id, self._body)
+        account.invalidate(self.sender_account, depositor_account)
         print("Deposit: %s" % result)
         assert is_message_success(result)
         # otme.accept_inbox_items(depositor_account._id, 0, "")
         return result
 
     def cancel(self):
-        outpayments_count = opentxs.OTAPI_Wrap_GetNym_OutpaymentsCount(self.sender_account.nym._id)
-        for i in range(outpayments_count):
-            body = opentxs.OTAPI_Wrap_GetNym_OutpaymentsContentsByIndex(
-                self.sender_nym._id, i)
-            if body == self._body:
-                # found it, now cancel it.
-                result = otme.cancel_outgoing_payments(
-                    self.sender_nym._id, self.sender_account._id, str(i))
-                assert result, "Unable to cancel cheque {}".format(self)
-                return
-        raise IndexError("Cheque {} not found in outpayments, can't cancel".format(self))
+        _cancel(self, outpayments.index(self.sender_nym._id).find(self._body))
 
 
 class Voucher:
@@ -80,10 +73,12 @@ class Voucher:
         """
         Withdraw voucher
         """
+        transnum.reserve(self.server_id, self.sender_nym._id)
         message = otme.withdraw_voucher(self.server_id, self.sender_nym._id,
                                         self.sender_account._id,
                                         self.recipient_nym and self.recipient_nym._id or "",
                                         self.memo, self.amount)
+        account.invalidate(self.sender_account)
         assert is_message_success(message)
         ledger = opentxs.OTAPI_Wrap_Message_GetLedger(message)
         transaction = opentxs.OTAPI_Wrap_Ledger_GetTransactionByIndex(
@@ -103,43 +98,124 @@ class Voucher:
 
     def deposit(self, depositor_nym, depositor_account):
         '''Deposit the cheque, getting a written copy from the server first if we don't have one.'''
+        transnum.reserve(self.server_id, depositor_nym._id)
         deposit = otme.deposit_cheque(self.server_id, depositor_nym._id, depositor_account._id,
                                       self._body)
+        account.invalidate(depositor_account)
         assert is_message_success(deposit)
         return deposit
 
     def cancel(self):
-        outpayments_count = opentxs.OTAPI_Wrap_GetNym_OutpaymentsCount(self.sender_account.nym._id)
-        for i in range(outpayments_count):
-            body = opentxs.OTAPI_Wrap_GetNym_OutpaymentsContentsByIndex(
-                self.sender_nym._id, i)
-            if body == self._body:
-                # found it, now cancel it.
-                result = otme.cancel_outgoing_payments(
-                    self.sender_nym._id, self.sender_account._id, str(i))
-                assert result, "Unable to cancel voucher {}".format(self)
-                return
-        raise IndexError("Voucher {} not found in {} outpayments, can't cancel".format(
-            self, outpayments_count))
-
-
-def send_transfer(server_id=None, acct_from=None, acct_to=None, note=None, amount=None):
+        _cancel(self, outpayments.index(self.sender_nym._id).find(self._body))
+
+
+def _cancel(instrument, i):
+    '''Cancel the cheque or voucher found at position i of the sender's
+       outpayments box'''
+    if i is None:
+        raise IndexError("{} not found in outpayments, can't cancel".format(instrument))
+    transnum.reserve(instrument.server_id, instrument.sender_nym._id)
+    result = otme.cancel_outgoing_payments(
+        instrument.sender_nym._id, instrument.sender_account._id, str(i))
+    outpayments.index(instrument.sender_nym._id).removed(i)
+    account.invalidate(instrument.sender_account)
+    assert result, "Unable to cancel {}".format(instrument)
+
+
+def cancel_many(instruments):
+    '''Cancel many cheques and vouchers, indexing each outpayments box at
+       most once.  All instruments must be found before any is cancelled.'''
+    found = []
+    for instrument in instruments:
+        i = outpayments.index(instrument.sender_nym._id).find(instrument._body)
+        if i is None:
+            raise IndexError("{} not found in outpayments, can't cancel".format(instrument))
+        found.append((i, instrument))
+    # cancel from the end of the box, so the positions of the rest stay valid
+    for i, instrument in sorted(found, key=lambda f: f[0], reverse=True):
+        index = outpayments.index(instrument.sender_nym._id)
+        with index.lock:
+            if index.contents(i) != instrument._body:
+                # the box changed since, look the instrument up again
+                i = index.find(instrument._body)
+            _cancel(instrument, i)
+
+
+def send_transfer(server_id=None, acct_from=None, acct_to=None, note=None, amount=None,
+                  accept_inbox=True):
+    '''Transfer amount from acct_from to acct_to.  Unless accept_inbox is
+       False, the transfer is accepted into the target account right away.'''
     server_id = server_id or server.first_id()
     print("transferring {} from {} to {} on {}".format(amount, acct_from, acct_to, server_id))
+    transnum.reserve(server_id, acct_from.nym._id)
     message = otme.send_transfer(server_id, acct_from.nym._id, acct_from._id,
                                  acct_to._id, amount, note)
+    account.invalidate(acct_from, acct_to)
     assert is_message_success(message)
-    # accept all inbox items in target account
-    assert otme.accept_inbox_items(acct_to._id, 0, "")
+    if accept_inbox:
+        assert accept_inbox_items(acct_to)
     return message
 
 
+def accept_inbox_items(acct):
+    '''Accept all inbox items in the account, returns whether it worked'''
+    transnum.reserve(acct.server_id, acct.nym._id)
+    accepted = otme.accept_inbox_items(acct._id, 0, "")
+    account.invalidate(acct)
+    return accepted
+
+
+class TransferOutcome:
+    '''The outcome of one transfer of send_transfers().  error is the
+       exception if the transfer or the acceptance into the target account
+       failed.'''
+
+    def __init__(self, acct_from, acct_to, amount, note):
+        self.acct_from = acct_from
+        self.acct_to = acct_to
+        self.amount = amount
+        self.note = note
+        self.message = None
+        self.accepted = False
+        self.error = None
+
+    def __repr__(self):
+        return "<TransferOutcome {} from {} to {}, accepted={}, error={}>".format(
+            self.amount, self.acct_from._id, self.acct_to._id, self.accepted, self.error)
+
+
+def send_transfers(batch):
+    '''Send a batch of transfers, given as (acct_from, acct_to, amount, note)
+       tuples, and then accept the inbox items once per target account.
+       Returns a TransferOutcome per transfer, in the order of the batch.'''
+    outcomes = []
+    targets = {}
+    for acct_from, acct_to, amount, note in batch:
+        outcome = TransferOutcome(acct_from, acct_to, amount, note)
+        outcomes.append(outcome)
+        try:
+            outcome.message = send_transfer(acct_from.server_id, acct_from, acct_to, note,
+                                            amount, accept_inbox=False)
+        except (Exception, ReturnValueError) as e:
+            outcome.error = e
+            continue
+        targets.setdefault(acct_to._id, (acct_to, []))[1].append(outcome)
+
+    for acct_to, sent in targets.values():
+        accepted = accept_inbox_items(acct_to)
+        for outcome in sent:
+            outcome.accepted = bool(accepted)
+            if not accepted:
+                outcome.error = ReturnValueError(accepted)
+    return outcomes
+
+
 @singledispatch
 def write(item):
     item.write()
 
 
-@write.method(Voucher)
+@write.register(Voucher)
 def write_voucher(v):
     v.withdraw()
 
@@ -150,21 +226,21 @@ def transfer(item, source_acct, target_acct):
     raise NotImplementedError("Don't know how to transfer {}'".format(item))
 
 
-@transfer.method(int)
+@transfer.register(int)
 def transfer_int(amount, source_acct, target_acct):
     '''Send amount via direct transfer'''
     return send_transfer(
         source_acct.server_id, source_acct, target_acct, "withdraw", amount)
 
 
-@transfer.method(Cheque)
+@transfer.register(Cheque)
 def transfer_cheque(cheque, source_acct, target_acct):
     '''Transfer funds by writing and depositing a cheque'''
     cheque.write()
     return cheque.deposit(target_acct.nym, target_acct)
 
 
-@transfer.method(Voucher)
+@transfer.register(Voucher)
 def transfer_voucher(voucher, source_acct, target_acct):
     '''Transfer funds by creating and depositing a voucher'''
     voucher.withdraw()
@@ -0,0 +1,213 @@
+"""Local notaries for running the tests: create a fresh config dir (or
+restore it from a snapshot), start opentxs-notary on it and wait until
+it answers.  Used by runtests.py, and by the test session of every
+pytest-xdist worker to get a client home and notary of its own.
+"""
+
+import pyopentxs
+from pyopentxs import notary, server, nym, wallet
+import hashlib
+import opentxs
+import os
+import psutil
+import shutil
+import subprocess
+import sys
+import time
+
+server_contract_file = os.path.join(os.path.dirname(__file__),
+                                    "../../test-data/sample-contracts/localhost.xml")
+total_servers = 2
+
+# snapshots of a freshly created config dir are kept here
+snapshot_root = os.path.join(os.path.dirname(__file__), "../../ot-clean-data")
+
+# isolated notaries listen on base_port + 1 + worker number
+base_port = 7085
+
+# the name of the nym wait_for_notary() pings with
+ping_nym_name = "notary ping"
+
+
+def create_fresh_ot_config(port=None):
+    if os.path.exists(pyopentxs.config_dir):
+        shutil.rmtree(pyopentxs.config_dir)
+
+    # create a client wallet just for making the server contract
+    os.system("opentxs --dummy-passphrase changepw")
+
+    # create server contract and empty the client side data
+    setup_data = notary.setup(open(server_contract_file), total_servers=total_servers, port=port)
+    p = subprocess.Popen(["opentxs-notary", "--only-init"], stdin=subprocess.PIPE)
+    outs, errs = p.communicate(input=setup_data.getvalue(), timeout=20)
+    # part of the config, so restarts and snapshots don't need a new one
+    ping_nym_id()
+
+
+def snapshot_dir(port=None):
+    '''Return the directory of the snapshot matching the installed opentxs
+       build and the server contract.  The build is identified by the
+       location, size and modification time of its binaries.'''
+    key = hashlib.sha1()
+    for path in [opentxs.__file__, shutil.which("opentxs"), shutil.which("opentxs-notary")]:
+        if path is None:
+            raise FileNotFoundError("opentxs and opentxs-notary must be on the PATH")
+        stat = os.stat(path)
+        key.update("{}:{}:{}\n".format(path, stat.st_size, stat.st_mtime).encode("utf-8"))
+    with open(server_contract_file, "rb") as f:
+        key.update(f.read())
+    key.update("{}:{}".format(total_servers, port).encode("utf-8"))
+    return os.path.join(snapshot_root, key.hexdigest()[:16])
+
+
+def save_snapshot(path):
+    '''Copy the current config dir and the list of active servers to path'''
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    shutil.copytree(pyopentxs.config_dir, os.path.join(tmp, ".ot"), symlinks=True)
+    with open(os.path.join(tmp, "active"), "w") as f:
+        f.write("\n".join(server.active))
+    os.rename(tmp, path)
+
+
+# directories of the config dir whose files OT writes once and never
+# modifies, so they can be hardlinked from a snapshot
+immutable_dirs = {"contracts", "credentials"}
+
+
+def _link_immutable(root):
+    '''Return a copytree() copy function that hardlinks the contracts and
+       credentials under root and copies all other files'''
+    def copy(src, dst):
+        if immutable_dirs.intersection(os.path.dirname(os.path.relpath(src, root)).split(os.sep)):
+            os.link(src, dst)
+        else:
+            shutil.copyfile(src, dst)
+    return copy
+
+
+def restore_snapshot(path, link=False):
+    '''Replace the config dir with the snapshot at path.  With link=True the
+       contracts and credentials are hardlinked instead of copied, which
+       is faster; files OT rewrites, like the wallets, are always copied
+       so that the snapshot stays as it was.'''
+    if os.path.exists(pyopentxs.config_dir):
+        shutil.rmtree(pyopentxs.config_dir)
+    root = os.path.join(path, ".ot")
+    shutil.copytree(root, pyopentxs.config_dir, symlinks=True,
+                    copy_function=_link_immutable(root) if link else shutil.copyfile)
+    with open(os.path.join(path, "active")) as f:
+        server.active[:] = f.read().split()
+
+
+def prepare_ot_config(snapshot=False, link=False, port=None):
+    '''Create a fresh config dir, restoring it from a snapshot if snapshot
+       is true.  The snapshot is created on first use.'''
+    start = time.perf_counter()
+    path = snapshot and snapshot_dir(port)
+    if path and os.path.exists(path):
+        restore_snapshot(path, link)
+        print("restored ot config from {}".format(path), file=sys.stderr)
+    else:
+        create_fresh_ot_config(port)
+        if path:
+            save_snapshot(path)
+            print("saved ot config snapshot to {}".format(path), file=sys.stderr)
+    print("ot config ready in {:.2f}s".format(time.perf_counter() - start), file=sys.stderr)
+
+
+def notary_files():
+    '''Return the paths of the pid file and the log of the notary using
+       the current config dir'''
+    home = os.path.dirname(pyopentxs.config_dir.rstrip("/"))
+    return os.path.join(home, "opentxs-notary.pid"), os.path.join(home, "opentxs-notary.log")
+
+
+def kill_isolated_notary():
+    '''Kill the notary started for the current config dir, if any'''
+    pid_file = notary_files()[0]
+    if not os.path.exists(pid_file):
+        return
+    with open(pid_file) as f:
+        pid = int(f.read())
+    os.remove(pid_file)
+    if psutil.pid_exists(pid):
+        proc = psutil.Process(pid)
+        if proc.name() == "opentxs-notary":
+            proc.kill()
+            psutil.wait_procs([proc], timeout=10)
+
+
+def restart_opentxs_notary(snapshot=False, link=False, port=None, isolated=False):
+    '''opentxs-notary must be on the PATH.  Returns the time.monotonic()
+       value when the notary was started.
+
+       Unless isolated is true, all running notaries are killed and the
+       log goes to opentxs-notary.log in the current directory.  Isolated
+       notaries only replace the one started for the same config dir and
+       keep their log next to it.'''
+    if isolated:
+        kill_isolated_notary()
+        pid_file, log_file = notary_files()
+    else:
+        # kill existing processes
+        for proc in psutil.process_iter():
+            if proc.name() == "opentxs-notary":
+                proc.kill()
+                psutil.wait_procs([proc], timeout=10)
+        pid_file, log_file = None, "opentxs-notary.log"
+
+    prepare_ot_config(snapshot, link, port)
+
+    # start new
+    started = time.monotonic()
+    with open(log_file, "w") as log:
+        proc = subprocess.Popen(["opentxs-notary"], stdout=log, stderr=subprocess.STDOUT)
+    if pid_file:
+        with open(pid_file, "w") as f:
+            f.write(str(proc.pid))
+    return started
+
+
+def ping_nym_id():
+    '''Return the id of the nym named ping_nym_name, which is created if
+       the wallet has none.  It is never registered.'''
+    for nym_id in wallet.index.nym_ids_by_name(ping_nym_name):
+        return nym_id
+    ping_nym = nym.Nym().create()
+    ping_nym.set_name(ping_nym_name)
+    return ping_nym._id
+
+
+def wait_for_notary(started):
+    '''Wait until the notary answers, the client must be initialized'''
+    startup = server.wait_until_ready(server.first_active_id(), ping_nym_id(), since=started)
+    print("opentxs-notary ready after {:.2f}s".format(startup), file=sys.stderr)
+    return startup
+
+
+def start_isolated(root, worker, snapshot=False, link=False):
+    '''Give this process a client home and a notary of its own, in
+       root/<worker> with the notary on base_port + 1 + the worker number
+       (the digits at the end of worker, e.g. "gw3" from pytest-xdist).'''
+    home = os.path.abspath(os.path.join(root, worker))
+    os.makedirs(home, exist_ok=True)
+    pyopentxs.set_home(home)
+    port = base_port + 1 + int(worker.lstrip("abcdefghijklmnopqrstuvwxyz"))
+    started = restart_opentxs_notary(snapshot, link, port, isolated=True)
+    pyopentxs.init()
+    wait_for_notary(started)
+
+
+def stop_isolated(root):
+    '''Kill the notaries of all isolated workers under root'''
+    for worker in os.listdir(root):
+        pyopentxs.set_home(os.path.join(root, worker))
+        kill_isolated_notary()
+
+
+def fresh_setup():
+    started = restart_opentxs_notary()
+    pyopentxs.init()
+    wait_for_notary(started)
@@ -0,0 +1,426 @@
+"""Market offers and a reference matching engine.
+
+Offers are placed with Offer(...).place() or in bulk with place_all().
+The markets of a server are read with markets(), offers() and trades(),
+which download the data at most every ttl seconds; offers() downloads
+the book a page at a time as it's read.  MatchingEngine
+computes the trades and balances to expect from a stream of offers, e.g.:
+
+engine = MatchingEngine(account.balances(accounts))
+for offer in place_all(offers, workers=1):
+    engine.submit(offer.order())
+wait_until_settled(accounts, [engine.balances[a._id] for a in accounts])
+"""
+
+from pyopentxs import ReturnValueError, is_message_success, otme, account, nym_lock, transnum
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import itertools
+import opentxs
+import threading
+import time
+
+
+def create_offer(asset_account, currency_account, scale, min_increment, quantity, price,
+                 selling, lifespan=10000, stop_sign="", activation_price=0):
+    '''Place a market offer to buy or sell quantity of the asset type of
+       asset_account for price (per scale units) of the asset type of
+       currency_account.  Returns the server reply.
+
+       Trades are executed later by the server's cron, so cached balances
+       of the two accounts are invalidated now but may go stale again
+       once the offer is filled; use Account.refresh() after settlement.
+    '''
+    # the offer and its closing receipts for both accounts
+    transnum.reserve(asset_account.server_id, asset_account.nym._id, 3)
+    message = otme.create_market_offer(asset_account._id, currency_account._id,
+                                       scale, min_increment, quantity, price, selling,
+                                       lifespan, stop_sign, activation_price)
+    account.invalidate(asset_account, currency_account)
+    invalidate(asset_account.server_id)
+    return message
+
+
+class Offer:
+    '''An offer to buy or sell quantity units of the asset type of
+       asset_account, for price units of the asset type of
+       currency_account per scale units.  A price of 0 makes it a market
+       order.  After place(), message is the server reply, or error the
+       exception if placing it failed.'''
+
+    def __init__(self, asset_account, currency_account, quantity, price, selling, scale=1,
+                 min_increment=1, lifespan=10000, stop_sign="", activation_price=0):
+        self.asset_account = asset_account
+        self.currency_account = currency_account
+        self.quantity = quantity
+        self.price = price
+        self.selling = selling
+        self.scale = scale
+        self.min_increment = min_increment
+        self.lifespan = lifespan
+        self.stop_sign = stop_sign
+        self.activation_price = activation_price
+        self.message = None
+        self.error = None
+
+    def place(self):
+        self.message = create_offer(self.asset_account, self.currency_account, self.scale,
+                                    self.min_increment, self.quantity, self.price,
+                                    self.selling, self.lifespan, self.stop_sign,
+                                    self.activation_price)
+        return self
+
+    def order(self):
+        '''Return the Order to submit to a MatchingEngine'''
+        return Order(self.asset_account._id, self.currency_account._id,
+                     (self.asset_account.server_id, self.asset_account.asset._id,
+                      self.currency_account.asset._id, self.scale),
+                     self.quantity, self.price, self.selling, self.scale, self.min_increment)
+
+    def __repr__(self):
+        return "<Offer {} {} at {}/{}, account={}>".format(
+            "sell" if self.selling else "buy", self.quantity, self.price, self.scale,
+            self.asset_account._id)
+
+
+def place_all(offers, workers=8):
+    '''Place the offers and return them.  Offers of the same nym are
+       placed one after another in the given order, those of different
+       nyms concurrently; with workers=1 all of them are placed in the
+       given order.  A failed offer gets its error set, the others are
+       still placed.'''
+    groups = {}
+    for offer in offers:
+        key = (offer.asset_account.server_id, offer.asset_account.nym._id)
+        groups.setdefault(key, []).append(offer)
+    groups = [offers] if workers == 1 else list(groups.values())
+
+    def place(group):
+        for offer in group:
+            with nym_lock(offer.asset_account.server_id, offer.asset_account.nym._id):
+                try:
+                    offer.place()
+                except (Exception, ReturnValueError) as e:
+                    offer.error = e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(place, group) for group in groups]
+        for future in futures:
+            future.result()
+    return offers
+
+
+class Order:
+    '''An offer as seen by the MatchingEngine, by account ids.  market is
+       any key of the market, Offer.order() uses (server id, asset type
+       id, currency type id, scale).  remaining is the quantity not yet
+       traded.'''
+
+    def __init__(self, asset_account_id, currency_account_id, market, quantity, price,
+                 selling, scale=1, min_increment=1):
+        self.asset_account_id = asset_account_id
+        self.currency_account_id = currency_account_id
+        self.market = market
+        self.quantity = quantity
+        self.remaining = quantity
+        self.price = price
+        self.selling = selling
+        self.scale = scale
+        self.min_increment = min_increment
+        self.sequence = None
+
+    def __repr__(self):
+        return "<Order {} {}/{} at {}/{}, account={}>".format(
+            "sell" if self.selling else "buy", self.remaining, self.quantity, self.price,
+            self.scale, self.asset_account_id)
+
+
+class Fill:
+    '''A trade between two orders: quantity of the asset for currency,
+       at the price of the order that was on the book'''
+
+    def __init__(self, seller, buyer, quantity, price, currency):
+        self.seller = seller
+        self.buyer = buyer
+        self.quantity = quantity
+        self.price = price
+        self.currency = currency
+
+    def __repr__(self):
+        return "<Fill {} at {} for {}, seller={}, buyer={}>".format(
+            self.quantity, self.price, self.currency, self.seller.asset_account_id,
+            self.buyer.asset_account_id)
+
+
+class MatchingEngine:
+    '''A local model of the notary's markets, to compute the fills and
+       balances to expect from a stream of orders.
+
+       Orders match by price, then by the order they were submitted in,
+       and trade at the price of the order already on the book.  A trade
+       is a multiple of the larger min_increment of the two orders, and
+       costs quantity * price // scale of the currency.  A market order
+       (price 0) takes what it can and the rest is dropped; a limit order
+       rests on the book.  When an account can't pay for a trade (issuer
+       accounts always can) its order is removed from the book, or for
+       the incoming order, dropped.  Stop orders and lifespans are not
+       modeled.'''
+
+    def __init__(self, balances, issuers=()):
+        self.balances = dict(balances)  # account id -> balance
+        self.issuers = set(issuers)
+        self.books = {}  # market -> (bids, asks), lists of (sort key, order)
+        self.trades = {}  # market -> list of Fill
+        self._sequence = itertools.count()
+
+    def _can_pay(self, account_id, amount):
+        return account_id in self.issuers or self.balances[account_id] >= amount
+
+    def submit(self, order):
+        '''Match the order against the book and return the list of fills'''
+        order.sequence = next(self._sequence)
+        bids, asks = self.books.setdefault(order.market, ([], []))
+        book = bids if order.selling else asks
+        fills = []
+        while order.remaining > 0 and book:
+            resting = book[0][1]
+            if order.price and (resting.price < order.price if order.selling
+                                else resting.price > order.price):
+                break
+            increment = max(order.min_increment, resting.min_increment)
+            quantity = min(order.remaining, resting.remaining) // increment * increment
+            if not quantity:
+                break
+            seller, buyer = (order, resting) if order.selling else (resting, order)
+            currency = quantity * resting.price // order.scale
+            if not self._can_pay(resting.asset_account_id if resting.selling
+                                 else resting.currency_account_id,
+                                 quantity if resting.selling else currency):
+                book.pop(0)
+                continue
+            if not self._can_pay(order.asset_account_id if order.selling
+                                 else order.currency_account_id,
+                                 quantity if order.selling else currency):
+                return fills
+            self.balances[seller.asset_account_id] -= quantity
+            self.balances[buyer.asset_account_id] += quantity
+            self.balances[buyer.currency_account_id] -= currency
+            self.balances[seller.currency_account_id] += currency
+            order.remaining -= quantity
+            resting.remaining -= quantity
+            if not resting.remaining:
+                book.pop(0)
+            fill = Fill(seller, buyer, quantity, resting.price, currency)
+            fills.append(fill)
+            self.trades.setdefault(order.market, []).append(fill)
+        if order.remaining and order.price:
+            own = asks if order.selling else bids
+            key = (order.price if order.selling else -order.price, order.sequence)
+            bisect.insort(own, (key, order))
+        return fills
+
+    def bids(self, market):
+        '''The resting buy orders of the market, best first'''
+        return [order for _, order in self.books.get(market, ([], []))[0]]
+
+    def asks(self, market):
+        '''The resting sell orders of the market, best first'''
+        return [order for _, order in self.books.get(market, ([], []))[1]]
+
+
+# seconds downloaded market data is served from the cache
+ttl = 10
+
+_cache = {}  # (server id, market id, what) -> (download time, data)
+_cache_lock = threading.Lock()
+
+# held from a download until its data is read back, as the client stores
+# every download of the same kind in the same file
+_storage_lock = threading.Lock()
+
+
+def invalidate(server_id, market_id=None):
+    '''Download the market data of the server (or of one of its markets)
+       again on next use'''
+    with _cache_lock:
+        for key in list(_cache):
+            if key[0] == server_id and (market_id is None or key[1] in (None, market_id)):
+                del _cache[key]
+
+
+def _cached(key, max_age, load):
+    max_age = ttl if max_age is None else max_age
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry and time.monotonic() - entry[0] < max_age:
+        return entry[1]
+    downloaded = time.monotonic()
+    data = load()
+    with _cache_lock:
+        _cache[key] = (downloaded, data)
+    return data
+
+
+def _download(request, server_id, nym, *args):
+    with nym_lock(server_id, nym._id):
+        message = getattr(otme, request)(server_id, nym._id, *args)
+    if not is_message_success(message):
+        raise ReturnValueError(message)
+
+
+def _stored(object_type, cast, server_id, *path):
+    '''Read the market data the client stored after a download'''
+    storable = opentxs.QueryObject(object_type, "markets", server_id, *path)
+    return storable and cast(storable)
+
+
+class MarketInfo:
+    '''A market of the server: asset type, currency type and scale, the
+       number of bids and asks and the prices'''
+
+    def __init__(self, data):
+        self._id = data.market_id
+        # todo: asset_type_id is the old api name, remove in due time
+        self.asset_id = getattr(data, "instrument_definition_id", None) or data.asset_type_id
+        self.currency_id = data.currency_type_id
+        self.scale = int(data.scale)
+        self.bids = int(data.number_bids)
+        self.asks = int(data.number_asks)
+        self.current_bid = int(data.current_bid)
+        self.current_ask = int(data.current_ask)
+        self.last_price = int(data.last_sale_price)
+
+    def __repr__(self):
+        return "<MarketInfo id={}, asset={}, currency={}, scale={}, bids={}, asks={}>".format(
+            self._id, self.asset_id, self.currency_id, self.scale, self.bids, self.asks)
+
+
+class BookEntry:
+    '''An offer on one side of a market's book'''
+
+    def __init__(self, data, selling):
+        self.transaction_id = int(data.transaction_id)
+        self.price = int(data.price_per_scale)
+        self.quantity = int(data.available_assets)
+        self.min_increment = int(data.minimum_increment)
+        self.date = int(data.date)
+        self.selling = selling
+
+    def __repr__(self):
+        return "<BookEntry {} {} at {}, transaction={}>".format(
+            "ask" if self.selling else "bid", self.quantity, self.price, self.transaction_id)
+
+
+class Trade:
+    '''A trade that took place in a market'''
+
+    def __init__(self, data):
+        self.transaction_id = int(data.transaction_id)
+        self.date = int(data.date)
+        self.price = int(data.price)
+        self.quantity = int(data.amount_sold)
+
+    def __repr__(self):
+        return "<Trade {} at {}, transaction={}>".format(
+            self.quantity, self.price, self.transaction_id)
+
+
+def markets(server_id, nym, max_age=None):
+    '''Return a list of MarketInfo, one for every market of the server,
+       downloaded on behalf of nym unless the cached list is less than
+       max_age (by default ttl) seconds old'''
+    def load():
+        with _storage_lock:
+            _download("get_market_list", server_id, nym)
+            market_list = _stored(opentxs.STORED_OBJ_MARKET_LIST,
+                                  opentxs.MarketList.ot_dynamic_cast, server_id, "market_data.bin")
+            if not market_list:
+                return []
+            return [MarketInfo(market_list.GetMarketData(i))
+                    for i in range(market_list.GetMarketDataCount())]
+    return list(_cached((server_id, None, "markets"), max_age, load))
+
+
+def find_market(server_id, nym, asset_id, currency_id, scale=1, max_age=None):
+    '''Return the MarketInfo trading asset_id for currency_id at scale, or
+       None if the server has no such market'''
+    for market in markets(server_id, nym, max_age):
+        if (market.asset_id, market.currency_id, market.scale) == (asset_id, currency_id, scale):
+            return market
+    return None
+
+
+def offers(server_id, nym, market_id, selling, page_size=100, max_age=None):
+    '''Yield a BookEntry for every ask (selling=True) or bid of the
+       market, best price first.  The server returns the top of the book
+       up to a depth, so the book is downloaded page_size entries deep,
+       and only if those are all read, again with twice the depth and so
+       on.  Every depth is cached like markets().
+
+       Each page is a new snapshot of the book, so entries already
+       yielded are skipped by transaction id.  If the book changed
+       between pages, no entry is yielded twice, but entries new since
+       the last page may come after worse priced ones.'''
+    def load(depth):
+        with _storage_lock:
+            _download("get_market_offers", server_id, nym, market_id, depth)
+            offer_list = _stored(opentxs.STORED_OBJ_OFFER_LIST_MARKET,
+                                 opentxs.OfferListMarket.ot_dynamic_cast,
+                                 server_id, "offers", market_id + ".bin")
+            if not offer_list:
+                return [], []
+            return ([BookEntry(offer_list.GetBidData(i), False)
+                     for i in range(offer_list.GetBidDataCount())],
+                    [BookEntry(offer_list.GetAskData(i), True)
+                     for i in range(offer_list.GetAskDataCount())])
+
+    depth = page_size
+    seen = set()
+    while True:
+        bids, asks = _cached((server_id, market_id, "offers", depth), max_age,
+                             lambda: load(depth))
+        entries = asks if selling else bids
+        for entry in entries:
+            if entry.transaction_id not in seen:
+                seen.add(entry.transaction_id)
+                yield entry
+        if len(entries) < depth:
+            return
+        depth *= 2
+
+
+def trades(server_id, nym, market_id, max_age=None):
+    '''Return a list of Trade, one for every recent trade of the market,
+       cached like markets()'''
+    def load():
+        with _storage_lock:
+            _download("get_market_recent_trades", server_id, nym, market_id)
+            trade_list = _stored(opentxs.STORED_OBJ_TRADE_LIST_MARKET,
+                                 opentxs.TradeListMarket.ot_dynamic_cast,
+                                 server_id, "recent", market_id + ".bin")
+            if not trade_list:
+                return []
+            return [Trade(trade_list.GetTradeDataMarket(i))
+                    for i in range(trade_list.GetTradeDataMarketCount())]
+    return list(_cached((server_id, market_id, "trades"), max_age, load))
+
+
+def wait_until_settled(accounts, expected, timeout=90, interval=0.5, max_interval=5):
+    '''Poll the balances of accounts until they equal the expected
+       balances (a list in the same order), with the interval between
+       polls growing up to max_interval.  Raises TimeoutError listing the
+       accounts that don't match if they still differ after timeout
+       seconds.'''
+    start = time.monotonic()
+    while True:
+        fetched = account.balances(accounts)
+        actual = [fetched[a._id] for a in accounts]
+        if actual == list(expected):
+            return
+        if time.monotonic() - start > timeout:
+            diff = ["{}: expected {}, actual {}".format(a._id, e, b)
+                    for a, e, b in zip(accounts, expected, actual) if e != b]
+            raise TimeoutError("Balances not settled after {}s:\n{}".format(
+                timeout, "\n".join(diff)))
+        time.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
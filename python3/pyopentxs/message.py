@@ -0,0 +1,99 @@
+"""Fields of OT reply messages and wallet XML, extracted with a streaming
+parser: the XML is parsed a chunk at a time and parsing stops as soon as
+the element needed has been seen, so the rest of a reply (and its
+signature) is never looked at.  Tag and attribute names are matched
+case-insensitively, OT having renamed some of them over time.
+"""
+
+from xml.etree.ElementTree import XMLPullParser, ParseError
+
+# characters fed to the parser at a time
+CHUNK = 4096
+
+
+def _name(tag):
+    # without namespace, lower case
+    return tag.rpartition("}")[2].lower()
+
+
+def elements(xml, events=("start",)):
+    '''Yield (event, name, element) of the XML in the text as it's parsed,
+       with the lower case tag name.  Text before the first tag, like the
+       header of a signed message, is skipped, and a parse error (e.g.
+       at the signature after the XML) ends the stream.  For "start"
+       events only the tag and attributes of the element are complete.'''
+    start = xml.find("<")
+    if start < 0:
+        return
+    parser = XMLPullParser(events)
+    try:
+        for i in range(start, len(xml), CHUNK):
+            parser.feed(xml[i:i + CHUNK])
+            for event, element in parser.read_events():
+                yield event, _name(element.tag), element
+    except ParseError:
+        return
+
+
+def find(xml, *names):
+    '''Return the attributes (with lower case names) of the first element
+       with one of the names, or None if there is none'''
+    names = [n.lower() for n in names]
+    for _, name, element in elements(xml):
+        if name in names:
+            return dict((_name(k), v) for k, v in element.attrib.items())
+    return None
+
+
+class AccountReply:
+    '''The reply to a request to create an asset account'''
+
+    def __init__(self, attributes):
+        self.success = attributes.get("success") == "true"
+        self.account_id = attributes.get("accountid")
+        self.nym_id = attributes.get("nymid")
+        # todo: serverid is the old name, remove in due time
+        self.server_id = attributes.get("notaryid") or attributes.get("serverid")
+
+    def __repr__(self):
+        return "<AccountReply success={}, account_id={}, nym_id={}, server_id={}>".format(
+            self.success, self.account_id, self.nym_id, self.server_id)
+
+
+def account_reply(xml):
+    '''Return the AccountReply in the server reply, or None if it isn't one'''
+    # todo: createAccountResponse is the old message name, remove in due time
+    attributes = find(xml, "registerAccountResponse", "createAccountResponse")
+    return attributes and AccountReply(attributes)
+
+
+class WalletContents:
+    '''What wallet.xml holds: the cached key, and the nyms, servers and
+       asset types as dicts of id -> name'''
+
+    def __init__(self, cached_key=None):
+        self.cached_key = cached_key
+        self.nyms = {}
+        self.servers = {}
+        self.assets = {}
+
+
+def wallet_contents(xml):
+    '''Return the WalletContents of the (decoded) wallet.xml'''
+    contents = WalletContents()
+    for event, name, element in elements(xml, ("start", "end")):
+        if event == "end":
+            if name == "cachedkey":
+                contents.cached_key = (element.text or "").strip()
+            continue
+        attributes = dict((_name(k), v) for k, v in element.attrib.items())
+        if name == "pseudonym":
+            contents.nyms[attributes.get("nymid")] = attributes.get("name")
+        # todo: server, serverid and assettypeid are the old names, remove in due time
+        elif name in ("notaryprovider", "server"):
+            contents.servers[attributes.get("notaryid") or attributes.get("serverid")] = \
+                attributes.get("name")
+        elif name == "assettype":
+            contents.assets[attributes.get("instrumentdefinitionid") or
+                            attributes.get("assettypeid")] = attributes.get("name")
+    return contents
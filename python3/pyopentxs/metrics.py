@@ -0,0 +1,153 @@
+"""Opt-in instrumentation of the OT API: counts the calls of every
+opentxs.OTAPI_Wrap_* function and OT_ME method, with their latency, the
+size of the strings passed in and returned, and how many raised.  While nothing is
+recorded the original functions are in place, so there is no overhead.
+
+Usage:
+from pyopentxs import metrics
+with metrics.recording() as stats:
+    Nym().register()
+print(stats.to_json())
+open("metrics.prom", "w").write(stats.to_prometheus())
+"""
+
+from contextlib import contextmanager
+import bisect
+import functools
+import json
+import opentxs
+import threading
+import time
+
+# upper bounds of the latency histogram buckets, in seconds
+BUCKETS = [0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, float("inf")]
+
+
+class Stats:
+    '''Call statistics per function name'''
+
+    def __init__(self):
+        self.functions = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, bytes_in, bytes_out, error=False):
+        with self._lock:
+            f = self.functions.get(name)
+            if f is None:
+                f = self.functions[name] = {"calls": 0, "errors": 0, "seconds": 0.0,
+                                            "bytes_in": 0, "bytes_out": 0,
+                                            "buckets": [0] * len(BUCKETS)}
+            f["calls"] += 1
+            f["errors"] += error
+            f["seconds"] += seconds
+            f["bytes_in"] += bytes_in
+            f["bytes_out"] += bytes_out
+            f["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps({"buckets": [str(b) for b in BUCKETS],
+                               "functions": self.functions}, indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        '''Return the statistics in the Prometheus text format'''
+        lines = ["# TYPE opentxs_call_seconds histogram",
+                 "# TYPE opentxs_call_bytes_in_total counter",
+                 "# TYPE opentxs_call_bytes_out_total counter",
+                 "# TYPE opentxs_call_errors_total counter"]
+        with self._lock:
+            for name, f in sorted(self.functions.items()):
+                label = 'function="{}"'.format(name)
+                count = 0
+                for bound, n in zip(BUCKETS, f["buckets"]):
+                    count += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('opentxs_call_seconds_bucket{{{},le="{}"}} {}'.format(
+                        label, le, count))
+                lines.append("opentxs_call_seconds_sum{{{}}} {}".format(label, f["seconds"]))
+                lines.append("opentxs_call_seconds_count{{{}}} {}".format(label, f["calls"]))
+                lines.append("opentxs_call_bytes_in_total{{{}}} {}".format(label, f["bytes_in"]))
+                lines.append("opentxs_call_bytes_out_total{{{}}} {}".format(label, f["bytes_out"]))
+                lines.append("opentxs_call_errors_total{{{}}} {}".format(label, f["errors"]))
+        return "\n".join(lines) + "\n"
+
+
+def _size(value):
+    return len(value) if isinstance(value, str) else 0
+
+
+# the Stats objects currently recording
+_active = []
+# (owner, attribute name) -> original function, while recording
+_originals = {}
+_lock = threading.Lock()
+
+
+def _wrap(name, f):
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = None
+        error = True
+        try:
+            result = f(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            bytes_in = sum(_size(a) for a in args)
+            for stats in list(_active):
+                stats.record(name, seconds, bytes_in, _size(result), error)
+    return wrapper
+
+
+def _targets():
+    '''Yield (owner, attribute name, metric name) of everything to instrument'''
+    for name in dir(opentxs):
+        if name.startswith("OTAPI_Wrap_") and callable(getattr(opentxs, name)):
+            yield opentxs, name, name
+    for name in dir(opentxs.OT_ME):
+        if not name.startswith("_") and callable(getattr(opentxs.OT_ME, name)):
+            yield opentxs.OT_ME, name, "OT_ME." + name
+
+
+def _patch():
+    for owner, attr, name in _targets():
+        original = getattr(owner, attr)
+        _originals[(owner, attr)] = original
+        setattr(owner, attr, _wrap(name, original))
+
+
+def _unpatch():
+    for (owner, attr), original in _originals.items():
+        setattr(owner, attr, original)
+    _originals.clear()
+
+
+def start(stats=None):
+    '''Start recording into stats (a new Stats object by default) and
+       return it'''
+    stats = stats or Stats()
+    with _lock:
+        if not _active:
+            _patch()
+        _active.append(stats)
+    return stats
+
+
+def stop(stats):
+    '''Stop recording into stats'''
+    with _lock:
+        _active.remove(stats)
+        if not _active:
+            _unpatch()
+
+
+@contextmanager
+def recording(stats=None):
+    '''Record the OT calls made inside the with block'''
+    stats = start(stats)
+    try:
+        yield stats
+    finally:
+        stop(stats)
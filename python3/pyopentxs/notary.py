@@ -1,59 +1,83 @@
 import pyopentxs
-import opentxs
-from pyopentxs import nym, config_dir, decode, server
-from contextlib import closing
-from bs4 import BeautifulSoup
+from pyopentxs import nym, decode_file, server, wallet
+import hashlib
 import io
 import os
+import re
 import shutil
+import threading
+
+# (template contract hash, index) -> decoded signed contract of an extra
+# fake server, reused by later setups in this process
+_fake_servers = {}
+_fake_servers_lock = threading.Lock()
 
 
 def make_server_contract(contract, server_nym):
     '''Takes a stream for a template contract, returns a tuple of
        (contract, cached_key, decoded_signed_contract)'''
     server_contract = server.add(server_nym._id, contract)
-    walletxml = decode(open(config_dir + "client_data/wallet.xml"))
-    cached_key = BeautifulSoup(walletxml).wallet.cachedkey.string.strip()
-    signed_contract_file = config_dir + "client_data/contracts/" + server_contract
-    with closing(open(signed_contract_file)) as f:
-        signed_contract = f.read()
-    decoded_signed_contract = decode(io.StringIO(signed_contract))
+    cached_key = wallet.parsed().cached_key
+    decoded_signed_contract = decode_file(
+        pyopentxs.config_dir + "client_data/contracts/" + server_contract)
     return (server_contract, cached_key, decoded_signed_contract)
 
 
-def setup(contract_stream, total_servers=1):
+def make_fake_server_contract(contract, index):
+    '''Return the decoded signed contract of the index'th extra (offline)
+       server for the template contract.  Each is signed by a new nym,
+       taken from nym.pool if one is ready, the first time and taken from
+       the cache after that.  Unlike make_server_contract() it doesn't
+       need the cached key.'''
+    key = (hashlib.sha1(contract.encode("utf-8")).hexdigest(), index)
+    with _fake_servers_lock:
+        decoded_signed_contract = _fake_servers.get(key)
+    if decoded_signed_contract is None:
+        server_contract = server.add(nym.Nym().create()._id, contract)
+        decoded_signed_contract = decode_file(
+            pyopentxs.config_dir + "client_data/contracts/" + server_contract)
+        with _fake_servers_lock:
+            _fake_servers[key] = decoded_signed_contract
+    return decoded_signed_contract
+
+
+def set_port(contract, port):
+    '''Return the template contract with the notary port replaced'''
+    return re.sub(r'(<notaryServer\b[^>]*\bport=")[0-9]*(")',
+                  r'\g<1>{}\g<2>'.format(port), contract)
+
+
+def setup(contract_stream, total_servers=1, port=None):
     '''
     Helps create a clean config dir starting from scratch.
     contract_stream is an input stream pointing to a template contract file.
     total_servers is an integer, of how many servers the client should have on file.
     Only the first server will actually exist, the rest will appear as offline.
+    port, if given, replaces the notary port of the template contract.
     '''
-    pyopentxs.init()
+    # the config dir was just replaced, load the new (empty) wallet even
+    # if an earlier setup loaded one
+    pyopentxs.init(reload=True)
     server_nym = nym.Nym().create()
 
     contract = contract_stream.read()
     contract_stream.close()
+    if port:
+        contract = set_port(contract, port)
 
     server_contract_id, cached_key, decoded_signed_contract \
         = make_server_contract(contract, server_nym)
 
-    walletxml = decode(open(config_dir + "client_data/wallet.xml"))
-    cached_key = BeautifulSoup(walletxml).wallet.cachedkey.string.strip()
-    signed_contract_file = config_dir + "client_data/contracts/" + server_contract_id
-    with closing(open(signed_contract_file)) as f:
-        signed_contract = f.read()
-    decoded_signed_contract = decode(io.StringIO(signed_contract))
-
     # copy the credentials to the server
-    server_data_dir = config_dir + "server_data/"
+    server_data_dir = pyopentxs.config_dir + "server_data/"
     if not os.path.exists(server_data_dir):
         os.mkdir(server_data_dir)
-    shutil.copytree(config_dir + "client_data/credentials", server_data_dir + "credentials")
+    shutil.copytree(pyopentxs.config_dir + "client_data/credentials", server_data_dir + "credentials")
     # remove the client-side data
-    shutil.rmtree(config_dir + "client_data")
+    shutil.rmtree(pyopentxs.config_dir + "client_data")
 
     # reread the client data (empty)
-    pyopentxs.init()
+    pyopentxs.init(reload=True)
 
     # since we still don't have programmatic access, just write the info
     # to use later to pipe to the notary process
@@ -69,14 +93,14 @@ def setup(contract_stream, total_servers=1):
     # cached_key)
 
     # add the server contract on the client side
-    opentxs.OTAPI_Wrap_AddServerContract(decoded_signed_contract)
+    server.add_contract(decoded_signed_contract)
 
     # should be just one known active server now
     server.active.append(server_contract_id)
 
-    # create any extra fake servers
-    for _ in range(total_servers - 1):
-        opentxs.OTAPI_Wrap_AddServerContract(
-            make_server_contract(contract, nym.Nym().create())[2])
+    # add any extra fake servers, only the first setup in the process
+    # generates keys for them
+    for i in range(1, total_servers):
+        server.add_contract(make_fake_server_contract(contract, i))
 
     return output
@@ -1,5 +1,109 @@
-from pyopentxs import otme, ReturnValueError, is_message_success, server
+from pyopentxs import otme, ReturnValueError, is_message_success, server, wallet, wallet_lock
 import opentxs
+import threading
+
+
+class NymPool:
+    '''Keeps a number of nyms created ahead of time by background
+       workers, so that Nym.create() doesn't have to wait for the key
+       generation.  The pool is empty and idle until start() is called;
+       the test session starts it with PYOPENTXS_NYM_POOL nyms.  The key
+       generation holds the wallet_lock, as it adds the nym to the wallet.
+
+    '''
+
+    # seconds a worker waits after a failed key generation, doubled after
+    # every further failure up to max_retry_interval
+    retry_interval = 0.5
+    max_retry_interval = 30
+
+    def __init__(self, keybits=1024):
+        self.keybits = keybits
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._ready = []
+        self._workers = []
+        self._cond = threading.Condition()
+
+    def start(self, size, workers=1, keybits=None):
+        '''Keep size nyms ready, generated by the given number of worker
+           threads.  Calling start() again resizes the pool.'''
+        with self._cond:
+            self.size = size
+            self.keybits = keybits or self.keybits
+            while len(self._workers) < workers:
+                worker = threading.Thread(target=self._work, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify_all()
+        return self
+
+    def stop(self):
+        '''Stop the workers.  Nyms already in the pool stay available.'''
+        with self._cond:
+            self.size = 0
+            workers, self._workers = self._workers, []
+            self._cond.notify_all()
+        for worker in workers:
+            worker.join()
+
+    def take(self, keybits):
+        '''Return the id of a ready nym with the given key size, or None if
+           there is none available.'''
+        with self._cond:
+            if self._ready and keybits == self.keybits:
+                self.hits += 1
+                nym_id = self._ready.pop(0)
+                self._cond.notify()
+                return nym_id
+            self.misses += 1
+            return None
+
+    def clear(self):
+        '''Forget the ready nyms, e.g. when the wallet was replaced'''
+        with self._cond:
+            self._ready = []
+            self._cond.notify_all()
+
+    def available(self):
+        with self._cond:
+            return len(self._ready)
+
+    def _work(self):
+        me = threading.current_thread()
+        retry_interval = self.retry_interval
+        while True:
+            with self._cond:
+                while me in self._workers and len(self._ready) >= self.size:
+                    self._cond.wait()
+                if me not in self._workers:
+                    return
+                keybits = self.keybits
+            with wallet_lock:
+                nym_id = otme.create_nym(keybits, "", "")
+                if nym_id != '':
+                    wallet.index.nym_changed(nym_id)
+                    # added under the wallet_lock, so a reload clears it
+                    with self._cond:
+                        if keybits == self.keybits:
+                            self._ready.append(nym_id)
+                            self._cond.notify_all()
+            if nym_id == '':
+                # inline creation will raise the error for the caller,
+                # the worker tries again later
+                with self._cond:
+                    self.failures += 1
+                    if me in self._workers:
+                        self._cond.wait(retry_interval)
+                retry_interval = min(retry_interval * 2, self.max_retry_interval)
+                continue
+            retry_interval = self.retry_interval
+
+
+# nyms created ahead of time, used by Nym.create()
+pool = NymPool()
 
 
 class Nym:
@@ -15,20 +119,29 @@ class Nym:
 
         Crashes with OT_FAIL if keysize is invalid.
 
+        Uses a nym from the pool if one with matching parameters is ready.
+
         Returns the nym object
         """
-        retval = otme.create_nym(keybits, nym_id_source, alt_location)
+        retval = None
+        if not (nym_id_source or alt_location):
+            retval = pool.take(keybits)
+        if retval is None:
+            with wallet_lock:
+                retval = otme.create_nym(keybits, nym_id_source, alt_location)
 
         if retval == '':
             # the nym id should be a 43-byte hash
             raise ReturnValueError(retval)
         self._id = retval
+        wallet.index.nym_changed(self._id)
         return self
 
     def set_name(self, name, signer_nym_id=None):
         success = opentxs.OTAPI_Wrap_SetNym_Name(self._id, signer_nym_id or self._id, name)
         if not success:
             raise ReturnValueError("Could not set nym name to {}")
+        wallet.index.nym_changed(self._id)
 
     def get_name(self):
         return opentxs.OTAPI_Wrap_GetNym_Name(self._id)
@@ -88,10 +201,8 @@ def get_all():
     """
     Return list of locally stored nyms.
     """
-    nym_count = opentxs.OTAPI_Wrap_GetNymCount()
     nyms = []
-    for i in range(nym_count):
-        nym_id = opentxs.OTAPI_Wrap_GetNym_ID(i)
+    for nym_id in wallet.index.nym_ids():
         if nym_id == '':
             # this is just a guess, a _id should never be an empty string
             raise ReturnValueError(nym_id)
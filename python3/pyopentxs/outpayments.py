@@ -0,0 +1,74 @@
+"""An index of the instruments in each nym's outpayments box, so that an
+instrument can be found without fetching every entry of the box over the
+API.  The index is built on first use, extended with entries added since
+and corrected when an entry is removed.
+"""
+
+import opentxs
+import hashlib
+import threading
+
+
+def _key(body):
+    return hashlib.sha1(body.encode("utf-8")).digest()
+
+
+class Index:
+    '''Positions of the instruments in the outpayments box of a nym, keyed
+       by a hash of the instrument body'''
+
+    def __init__(self, nym_id):
+        self.nym_id = nym_id
+        self.positions = {}
+        self.scanned = 0
+        self.lock = threading.RLock()
+
+    def contents(self, i):
+        '''Return the instrument at position i of the box'''
+        return opentxs.OTAPI_Wrap_GetNym_OutpaymentsContentsByIndex(self.nym_id, i)
+
+    def update(self):
+        '''Index the entries added to the box since the last update'''
+        with self.lock:
+            count = opentxs.OTAPI_Wrap_GetNym_OutpaymentsCount(self.nym_id)
+            if count < self.scanned:
+                # entries were removed behind our back, start over
+                self.positions = {}
+                self.scanned = 0
+            for i in range(self.scanned, count):
+                self.positions[_key(self.contents(i))] = i
+            self.scanned = count
+
+    def find(self, body):
+        '''Return the position of the instrument in the box, or None'''
+        with self.lock:
+            self.update()
+            i = self.positions.get(_key(body))
+            if i is not None and self.contents(i) == body:
+                return i
+            # the box changed in a way we didn't notice, reindex it
+            self.positions = {}
+            self.scanned = 0
+            self.update()
+            return self.positions.get(_key(body))
+
+    def removed(self, i):
+        '''Tell the index that the entry at position i may have been removed'''
+        with self.lock:
+            if opentxs.OTAPI_Wrap_GetNym_OutpaymentsCount(self.nym_id) != self.scanned - 1:
+                return
+            self.positions = dict((key, pos - 1 if pos > i else pos)
+                                  for key, pos in self.positions.items() if pos != i)
+            self.scanned -= 1
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index(nym_id):
+    '''Return the outpayments index of the nym'''
+    with _indexes_lock:
+        if nym_id not in _indexes:
+            _indexes[nym_id] = Index(nym_id)
+        return _indexes[nym_id]
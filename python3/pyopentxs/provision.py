@@ -0,0 +1,109 @@
+"""Bulk provisioning of users: registers nyms, creates an account per
+asset type and sends the opening balances from the issuer accounts.
+Users are processed concurrently, so the server round trips of the
+different stages overlap instead of running one after another.
+
+Usage:
+from pyopentxs import provision
+rows = provision.provision(1000, [btc, silver], {btc._id: 100})
+print(provision.summary(rows))
+"""
+
+from pyopentxs import ReturnValueError, nym_lock, server
+from pyopentxs.account import Account
+from pyopentxs.instrument import accept_inbox_items, send_transfer
+from pyopentxs.nym import Nym
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import time
+
+# the stages every user goes through, in order
+STAGES = ["register", "create_accounts", "fund", "accept_inbox"]
+
+
+class Provisioned:
+    '''A row of the provisioning result: the nym of one user, its accounts
+       keyed by asset id and the seconds spent in each stage.  error is
+       set to the exception if provisioning of the user failed.'''
+
+    def __init__(self, nym):
+        self.nym = nym
+        self.accounts = {}
+        self.timings = {}
+        self.error = None
+
+    def __repr__(self):
+        return "<Provisioned nym={}, accounts={}, timings={}, error={}>".format(
+            self.nym, self.accounts, self.timings, self.error)
+
+
+@contextmanager
+def _timed(row, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        row.timings[stage] = time.perf_counter() - start
+
+
+def _provision_one(row, assets, balances, server_id):
+    try:
+        with _timed(row, "register"):
+            row.nym.register(server_id)
+
+        with _timed(row, "create_accounts"):
+            for asset in assets:
+                row.accounts[asset._id] = Account(asset, row.nym, server_id).create()
+
+        funded = []
+        with _timed(row, "fund"):
+            for asset in assets:
+                amount = balances.get(asset._id)
+                if not amount:
+                    continue
+                issuer_account = asset.issuer_account
+                account = row.accounts[asset._id]
+                # all users are funded from the same issuer nym
+                with nym_lock(server_id, issuer_account.nym._id):
+                    send_transfer(server_id, issuer_account, account, "opening balance",
+                                  amount, accept_inbox=False)
+                funded.append(account)
+
+        with _timed(row, "accept_inbox"):
+            for account in funded:
+                assert accept_inbox_items(account), "Unable to accept inbox of {}".format(account)
+    except (Exception, ReturnValueError) as e:
+        row.error = e
+
+
+def provision(users, assets, balances=None, server_id=None, workers=8):
+    '''Provision users on the given server (by default the first active one).
+       users is either the number of users to create or a list of Nym
+       objects, which are registered if necessary.  assets is a list of
+       issued Asset objects, each user gets one account of every asset
+       type.  balances maps asset ids to the opening balance sent from
+       the asset's issuer account.  Returns a list of Provisioned rows in
+       the order of users.
+
+    '''
+    server_id = server_id or server.first_active_id()
+    nyms = [Nym() for _ in range(users)] if isinstance(users, int) else list(users)
+    rows = [Provisioned(n) for n in nyms]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for row in rows:
+            executor.submit(_provision_one, row, assets, balances or {}, server_id)
+    return rows
+
+
+def summary(rows):
+    '''Return a dict of stage -> (total, max) seconds over all rows'''
+    result = {}
+    for stage in STAGES:
+        times = [row.timings[stage] for row in rows if stage in row.timings]
+        result[stage] = (sum(times), max(times or [0]))
+    return result
+
+
+def failed(rows):
+    '''Return the rows whose provisioning failed'''
+    return [row for row in rows if row.error is not None]
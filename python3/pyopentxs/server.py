@@ -1,36 +1,78 @@
+from pyopentxs import wallet_lock
 import opentxs
+import time
 
 # the ids of the notaries we know we should be able to contact
 active = []
 
+# the locally registered servers as a list of [id, name] pairs, a dict of
+# id -> name and a dict of name -> list of ids, or None if not loaded yet
+_registry = None
+
 
 def add(nym_id, contract):
     '''Create a server contract with the given nym_id and the contract
     contents.'''
-    contract_id = opentxs.OTAPI_Wrap_CreateServerContract(nym_id, contract)
+    with wallet_lock:
+        contract_id = opentxs.OTAPI_Wrap_CreateServerContract(nym_id, contract)
+    invalidate()
     assert(len(contract_id) > 0)
     return contract_id
 
 
+def add_contract(signed_contract):
+    '''Add a signed server contract to the wallet'''
+    with wallet_lock:
+        added = opentxs.OTAPI_Wrap_AddServerContract(signed_contract)
+    invalidate()
+    return added
+
+
+def invalidate():
+    '''Forget the cached list of servers, e.g. after the wallet was
+    reloaded'''
+    global _registry
+    _registry = None
+
+
+def _load():
+    global _registry
+    registry = _registry
+    if registry is None:
+        servers = []
+        for i in range(opentxs.OTAPI_Wrap_GetServerCount()):
+            server_id = opentxs.OTAPI_Wrap_GetServer_ID(i)
+            server_name = opentxs.OTAPI_Wrap_GetServer_Name(server_id)
+            servers.append([server_id, server_name])
+        by_name = {}
+        for server_id, server_name in servers:
+            by_name.setdefault(server_name, []).append(server_id)
+        registry = _registry = (servers, dict(servers), by_name)
+    return registry
+
+
 def get_all():
     '''Return a list of pairs of [id, name] of all the locally registered servers.'''
-    server_count = opentxs.OTAPI_Wrap_GetServerCount()
-    servers = []
-    for i in range(server_count):
-        server_id = opentxs.OTAPI_Wrap_GetServer_ID(i)
-        server_name = opentxs.OTAPI_Wrap_GetServer_Name(server_id)
-        servers.append([server_id, server_name])
+    return [list(s) for s in _load()[0]]
+
 
-    return servers
+def name(server_id):
+    '''Return the name of the server, or None if it isn't registered'''
+    return _load()[1].get(server_id)
+
+
+def ids_by_name(server_name):
+    '''Return the ids of the servers with the given name'''
+    return list(_load()[2].get(server_name, []))
 
 
 def first_id():
-    return get_all()[0][0]
+    return _load()[0][0][0]
 
 
 def only_id():
     '''Returns the server id if there is only one server, otherwise raises an error'''
-    servers = get_all()
+    servers = _load()[0]
     if len(servers) == 0:
         return None
     assert len(servers) == 1, "There are multiple servers, you must explicitly pick one"
@@ -62,6 +104,27 @@ def check_id(server_id, user_id):
     return retval == 1
 
 
+def wait_until_ready(server_id, user_id, timeout=60, since=None, interval=0.05,
+                     max_interval=2):
+    """
+    Ping the server until it answers, doubling the interval between pings
+    up to max_interval.  user_id doesn't need to be registered.
+
+    Returns the number of seconds from since (a time.monotonic() value,
+    e.g. taken when the server process was started) or from the call
+    until the server answered.  Raises TimeoutError if it didn't answer
+    within timeout seconds.
+    """
+    start = time.monotonic()
+    since = since or start
+    while not check_id(server_id, user_id):
+        if time.monotonic() - start > timeout:
+            raise TimeoutError("Server {} not ready after {}s".format(server_id, timeout))
+        time.sleep(interval)
+        interval = min(interval * 2, max_interval)
+    return time.monotonic() - since
+
+
 def first_active_id():
     '''Return the first known active notary, or if there are none, just
     the first one.  We should have at least one we're talking to.
@@ -74,7 +137,7 @@ def first_active_id():
 
 
 def first_inactive_id():
-    for s in get_all():
+    for s in _load()[0]:
         if s[0] not in active:
             return s[0]
     return None
@@ -0,0 +1,778 @@
+"""A pure Python stand-in for the opentxs module, implementing the part
+of OTAPI_Wrap and OT_ME that pyopentxs uses on an in-memory ledger.  The
+wallet and a single notary live in this process, so the client code can
+be run and benchmarked without building opentxs or starting a notary.
+
+It is selected by setting PYOPENTXS_BACKEND=simulated before importing
+pyopentxs.  Every request to the notary is delayed by latency seconds and
+every key generation by keygen_latency seconds, which can be set here or
+with PYOPENTXS_SIM_LATENCY and PYOPENTXS_SIM_KEYGEN_LATENCY.
+
+The rules enforced are the ones the tests rely on: nyms must be
+registered, accounts owned by the nym using them, amounts positive and
+balances within int64 (and not negative, except for issuer accounts),
+instruments valid, deposited once and only by their recipient.  Market
+offers trade as soon as they are placed, by the rules of
+pyopentxs.market.MatchingEngine; stop orders are accepted but never
+traded.  Files like wallet.xml are not written, so notary.setup()
+doesn't work with this backend.
+"""
+
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from xml.sax.saxutils import quoteattr
+
+latency = float(os.environ.get("PYOPENTXS_SIM_LATENCY", 0))
+keygen_latency = float(os.environ.get("PYOPENTXS_SIM_KEYGEN_LATENCY", 0))
+
+# the server contract and number of servers LoadWallet() sets up in an empty wallet
+server_contract_file = os.path.join(os.path.dirname(__file__),
+                                    "../../test-data/sample-contracts/localhost.xml")
+total_servers = 2
+
+# transaction numbers handed out per request for more
+TRANSACTION_NUMBER_BATCH = 50
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+_lock = threading.RLock()
+_random = random.Random()
+_id_chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+class _Nym:
+    def __init__(self, _id):
+        self._id = _id
+        self.name = ""
+        self.registered = set()  # server ids
+        self.outpayments = []  # instrument bodies
+
+
+class _Asset:
+    def __init__(self, _id, name, contract, signer):
+        self._id = _id
+        self.name = name
+        self.contract = contract
+        self.signer = signer
+        self.issued = set()  # server ids
+
+
+class _Account:
+    def __init__(self, _id, server_id, nym_id, asset_id, issuer=False):
+        self._id = _id
+        self.server_id = server_id
+        self.nym_id = nym_id
+        self.asset_id = asset_id
+        self.issuer = issuer
+        self.balance = 0
+        # the balance as last seen by the client
+        self.wallet_balance = 0
+        self.inbox = []  # amounts of pending transfers
+
+    def can_hold(self, balance):
+        return (INT64_MIN if self.issuer else 0) <= balance <= INT64_MAX
+
+
+class _Instrument:
+    def __init__(self, kind, number, server_id, amount, account, nym_id, recipient_id,
+                 valid_from, valid_to, memo):
+        self.kind = kind
+        self.number = number
+        self.server_id = server_id
+        self.amount = amount
+        self.account = account
+        self.nym_id = nym_id
+        self.recipient_id = recipient_id
+        self.valid_from = valid_from
+        self.valid_to = valid_to
+        self.memo = memo
+        self.used = False
+        self.body = '<simulated{} notaryID="{}" transactionNum="{}" amount="{}" ' \
+                    'senderAcctID="{}" senderNymID="{}" recipientNymID="{}" ' \
+                    'validFrom="{}" validTo="{}" memo={}/>'.format(
+                        kind.capitalize(), server_id, number, amount, account._id, nym_id,
+                        recipient_id, valid_from, valid_to, quoteattr(memo))
+
+
+# wallet and notary state, guarded by _lock
+_servers = []  # [id, name, signed contract] in wallet order
+_active = set()  # ids of the servers the notary answers for
+_nyms = {}
+_assets = {}
+_accounts = {}
+_instruments = {}
+_transaction_numbers = {}  # (server id, nym id) -> count
+_stop_offers = []
+_market = [None]  # the MatchingEngine, created with the first offer
+_trades = {}  # market -> [(transaction number, date, price, quantity)]
+_downloads = {}  # storage path -> market data downloaded by the client
+_last_number = [0]
+
+
+def reset():
+    '''Forget the wallet and the notary state'''
+    with _lock:
+        for state in [_servers, _stop_offers]:
+            del state[:]
+        for state in [_active, _nyms, _assets, _accounts, _instruments, _transaction_numbers,
+                      _trades, _downloads]:
+            state.clear()
+        _last_number[0] = 0
+        _market[0] = None
+
+
+def _new_id():
+    return "".join(_random.choice(_id_chars) for _ in range(43))
+
+
+def _next_number():
+    _last_number[0] += 1
+    return _last_number[0]
+
+
+def _round_trip():
+    if latency:
+        time.sleep(latency)
+
+
+def _message(name, success=True, **attributes):
+    return '<?xml version="1.0"?>\n<OTmessage version="2.0">\n<{} success="{}"{}/>\n' \
+           '</OTmessage>'.format(name, "true" if success else "false",
+                                 "".join(' {}={}'.format(k, quoteattr(str(v)))
+                                         for k, v in sorted(attributes.items())))
+
+
+def _attribute(text, name):
+    match = re.search(r'\b{}="([^"]*)"'.format(name), text)
+    return match and match.group(1)
+
+
+def _trade(order):
+    '''Match the order on the notary's markets'''
+    from pyopentxs import market
+    engine = _market[0] = _market[0] or market.MatchingEngine({})
+    engine.balances = dict((_id, a.balance) for _id, a in _accounts.items())
+    engine.issuers = set(_id for _id, a in _accounts.items() if a.issuer)
+    for fill in engine.submit(order):
+        _trades.setdefault(order.market, []).append(
+            (order.number, order.date, fill.price, fill.quantity))
+    for _id, balance in engine.balances.items():
+        _accounts[_id].balance = balance
+
+
+def _market_id(market):
+    return hashlib.sha1(repr(market).encode()).hexdigest()
+
+
+def _market_by_id(server_id, market_id):
+    for market in (_market[0].books if _market[0] else []):
+        if market[0] == server_id and _market_id(market) == market_id:
+            return market
+    return None
+
+
+def _registered(server_id, nym_id):
+    nym = _nyms.get(nym_id)
+    return server_id in _active and nym is not None and server_id in nym.registered
+
+
+def _owned_account(server_id, nym_id, account_id):
+    '''Return the account if it's on server_id and owned by the registered nym'''
+    account = _accounts.get(account_id)
+    if account and account.server_id == server_id and account.nym_id == nym_id \
+            and _registered(server_id, nym_id):
+        return account
+    return None
+
+
+def _use_transaction_number(server_id, nym_id):
+    '''Use up one of the nym's transaction numbers, fetching more first if
+       there are none left'''
+    key = (server_id, nym_id)
+    if not _transaction_numbers.get(key):
+        _round_trip()
+        _transaction_numbers[key] = TRANSACTION_NUMBER_BATCH
+    _transaction_numbers[key] -= 1
+    return _next_number()
+
+
+def _instrument(body):
+    number = _attribute(body or "", "transactionNum")
+    return number and _instruments.get(int(number))
+
+
+# application and wallet
+
+def OTAPI_Wrap_AppInit():
+    return True
+
+
+def OTAPI_Wrap_LoadWallet():
+    with _lock:
+        if not _servers:
+            with open(server_contract_file) as f:
+                contract = f.read()
+            for i in range(total_servers):
+                server_id = OTAPI_Wrap_CreateServerContract(OT_ME().create_nym(1024, "", ""),
+                                                            contract)
+                if i == 0:
+                    _active.add(server_id)
+    return True
+
+
+def OTAPI_Wrap_AppCleanup():
+    return True
+
+
+def OTAPI_Wrap_Decode(encoded, line_breaks):
+    return encoded
+
+
+def OTAPI_Wrap_Message_GetSuccess(message):
+    return 1 if 'success="true"' in message else 0
+
+
+# servers
+
+def OTAPI_Wrap_CreateServerContract(nym_id, contract):
+    with _lock:
+        if nym_id not in _nyms:
+            return ""
+        server_id = _new_id()
+        signed = '<simulatedServerContract notaryID="{}" signerNymID="{}">\n{}\n' \
+                 '</simulatedServerContract>'.format(server_id, nym_id, contract)
+        _servers.append([server_id, _attribute(contract, "shortname") or "", signed])
+        return server_id
+
+
+def OTAPI_Wrap_AddServerContract(contract):
+    with _lock:
+        server_id = _attribute(contract, "notaryID")
+        if not server_id:
+            return 0
+        if server_id not in [s[0] for s in _servers]:
+            _servers.append([server_id, _attribute(contract, "shortname") or "", contract])
+        return 1
+
+
+def OTAPI_Wrap_GetServerCount():
+    return len(_servers)
+
+
+def OTAPI_Wrap_GetServer_ID(i):
+    with _lock:
+        return _servers[i][0] if 0 <= i < len(_servers) else ""
+
+
+def OTAPI_Wrap_GetServer_Name(server_id):
+    with _lock:
+        return next((s[1] for s in _servers if s[0] == server_id), "")
+
+
+def OTAPI_Wrap_pingNotary(server_id, nym_id):
+    _round_trip()
+    with _lock:
+        return 1 if server_id in _active and nym_id in _nyms else -1
+
+
+# nyms
+
+def OTAPI_Wrap_SetNym_Name(nym_id, signer_nym_id, name):
+    if not isinstance(name, str):
+        raise TypeError("in method 'OTAPI_Wrap_SetNym_Name', argument 3 of type 'std::string const &'")
+    with _lock:
+        if nym_id not in _nyms or signer_nym_id not in _nyms:
+            return False
+        _nyms[nym_id].name = name
+        return True
+
+
+def OTAPI_Wrap_GetNym_Name(nym_id):
+    with _lock:
+        return _nyms[nym_id].name if nym_id in _nyms else ""
+
+
+def OTAPI_Wrap_GetNymCount():
+    return len(_nyms)
+
+
+def OTAPI_Wrap_GetNym_ID(i):
+    with _lock:
+        ids = list(_nyms)
+        return ids[i] if 0 <= i < len(ids) else ""
+
+
+def OTAPI_Wrap_unregisterNym(server_id, nym_id):
+    _round_trip()
+    with _lock:
+        if not _registered(server_id, nym_id):
+            return -1
+        _nyms[nym_id].registered.discard(server_id)
+        _transaction_numbers.pop((server_id, nym_id), None)
+        return 1
+
+
+def OTAPI_Wrap_GetNym_TransactionNumCount(server_id, nym_id):
+    with _lock:
+        return _transaction_numbers.get((server_id, nym_id), 0)
+
+
+def OTAPI_Wrap_GetNym_OutpaymentsCount(nym_id):
+    with _lock:
+        return len(_nyms[nym_id].outpayments) if nym_id in _nyms else 0
+
+
+def OTAPI_Wrap_GetNym_OutpaymentsContentsByIndex(nym_id, i):
+    with _lock:
+        outpayments = _nyms[nym_id].outpayments if nym_id in _nyms else []
+        return outpayments[i] if 0 <= i < len(outpayments) else ""
+
+
+# asset types
+
+def OTAPI_Wrap_CreateAssetContract(nym_id, contract):
+    with _lock:
+        if nym_id not in _nyms:
+            return ""
+        asset_id = _new_id()
+        signed = '<simulatedAssetContract instrumentDefinitionID="{}" signerNymID="{}">\n{}\n' \
+                 '</simulatedAssetContract>'.format(asset_id, nym_id, contract)
+        name = _attribute(re.search(r"<currency\b[^>]*>", contract).group(0)
+                          if "<currency" in contract else "", "name")
+        _assets[asset_id] = _Asset(asset_id, name or "", signed, nym_id)
+        return asset_id
+
+
+def OTAPI_Wrap_GetAssetType_Contract(asset_id):
+    with _lock:
+        return _assets[asset_id].contract if asset_id in _assets else ""
+
+
+def OTAPI_Wrap_GetAssetTypeCount():
+    return len(_assets)
+
+
+def OTAPI_Wrap_GetAssetType_ID(i):
+    with _lock:
+        ids = list(_assets)
+        return ids[i] if 0 <= i < len(ids) else ""
+
+
+def OTAPI_Wrap_GetAssetType_Name(asset_id):
+    with _lock:
+        return _assets[asset_id].name if asset_id in _assets else ""
+
+
+def OTAPI_Wrap_Message_GetNewIssuerAcctID(message):
+    return _attribute(message, "accountID") or ""
+
+
+# accounts
+
+def OTAPI_Wrap_GetAccountCount():
+    return len(_accounts)
+
+
+def OTAPI_Wrap_GetAccountWallet_ID(i):
+    with _lock:
+        ids = list(_accounts)
+        return ids[i] if 0 <= i < len(ids) else ""
+
+
+def OTAPI_Wrap_GetAccountWallet_Balance(account_id):
+    with _lock:
+        return _accounts[account_id].wallet_balance if account_id in _accounts else INT64_MIN
+
+
+def OTAPI_Wrap_GetAccountWallet_NymID(account_id):
+    with _lock:
+        return _accounts[account_id].nym_id if account_id in _accounts else ""
+
+
+def OTAPI_Wrap_GetAccountWallet_InstrumentDefinitionID(account_id):
+    with _lock:
+        return _accounts[account_id].asset_id if account_id in _accounts else ""
+
+
+def OTAPI_Wrap_GetAccountWallet_NotaryID(account_id):
+    with _lock:
+        return _accounts[account_id].server_id if account_id in _accounts else ""
+
+
+def OTAPI_Wrap_GetAccountWallet_Name(account_id):
+    return ""
+
+
+def OTAPI_Wrap_getAccountData(server_id, nym_id, account_id):
+    _round_trip()
+    with _lock:
+        account = _owned_account(server_id, nym_id, account_id)
+        if not account:
+            return -1
+        account.wallet_balance = account.balance
+        return 1
+
+
+def OTAPI_Wrap_deleteAssetAccount(server_id, nym_id, account_id):
+    _round_trip()
+    with _lock:
+        account = _owned_account(server_id, nym_id, account_id)
+        if not account or account.issuer or account.balance or account.inbox:
+            return -1
+        del _accounts[account_id]
+        return 1
+
+
+# cheques and vouchers
+
+def OTAPI_Wrap_WriteCheque(server_id, amount, valid_from, valid_to, account_id, nym_id, memo,
+                           recipient_nym_id):
+    with _lock:
+        account = _owned_account(server_id, nym_id, account_id)
+        if not account or valid_to < valid_from \
+                or not _transaction_numbers.get((server_id, nym_id)):
+            return ""
+        cheque = _Instrument("cheque", _use_transaction_number(server_id, nym_id), server_id,
+                             amount, account, nym_id, recipient_nym_id, valid_from, valid_to,
+                             memo)
+        _instruments[cheque.number] = cheque
+        _nyms[nym_id].outpayments.append(cheque.body)
+        return cheque.body
+
+
+def OTAPI_Wrap_Message_GetLedger(message):
+    number = _attribute(message, "transactionNum")
+    return '<ledger transactionNum="{}"/>'.format(number) if number else ""
+
+
+def OTAPI_Wrap_Ledger_GetTransactionByIndex(server_id, nym_id, account_id, ledger, i):
+    number = _attribute(ledger, "transactionNum")
+    return '<transaction transactionNum="{}"/>'.format(number) if number and i == 0 else ""
+
+
+def OTAPI_Wrap_Transaction_GetVoucher(server_id, nym_id, account_id, transaction):
+    with _lock:
+        voucher = _instrument(transaction)
+        return voucher.body if voucher and voucher.kind == "voucher" else ""
+
+
+class OT_ME:
+    '''The OT_ME requests, returning the server reply or "" on failure'''
+
+    def create_nym(self, keybits, nym_id_source, alt_location):
+        if keygen_latency:
+            time.sleep(keygen_latency)
+        with _lock:
+            nym_id = _new_id()
+            _nyms[nym_id] = _Nym(nym_id)
+            return nym_id
+
+    def register_nym(self, server_id, nym_id):
+        _round_trip()
+        with _lock:
+            if server_id not in _active or nym_id not in _nyms:
+                return ""
+            _nyms[nym_id].registered.add(server_id)
+            return _message("registerNymResponse", nymID=nym_id, notaryID=server_id)
+
+    def check_nym(self, server_id, nym_id, target_nym_id):
+        _round_trip()
+        with _lock:
+            if not (_registered(server_id, nym_id) and _registered(server_id, target_nym_id)):
+                return ""
+            return _message("checkNymResponse", nymID=nym_id, targetNymID=target_nym_id)
+
+    def make_sure_enough_trans_nums(self, count, server_id, nym_id):
+        with _lock:
+            if not _registered(server_id, nym_id):
+                return False
+            key = (server_id, nym_id)
+            fetch = _transaction_numbers.get(key, 0) < count
+        while fetch:
+            _round_trip()
+            with _lock:
+                _transaction_numbers[key] = \
+                    _transaction_numbers.get(key, 0) + TRANSACTION_NUMBER_BATCH
+                fetch = _transaction_numbers[key] < count
+        return True
+
+    def issue_asset_type(self, server_id, nym_id, contract):
+        _round_trip()
+        with _lock:
+            asset = _assets.get(_attribute(contract, "instrumentDefinitionID"))
+            if not asset or asset.signer != nym_id or server_id in asset.issued \
+                    or not _registered(server_id, nym_id):
+                return ""
+            asset.issued.add(server_id)
+            account = _Account(_new_id(), server_id, nym_id, asset._id, issuer=True)
+            _accounts[account._id] = account
+            return _message("registerInstrumentDefinitionResponse", accountID=account._id,
+                            instrumentDefinitionID=asset._id, nymID=nym_id, notaryID=server_id)
+
+    def create_asset_acct(self, server_id, nym_id, asset_id):
+        _round_trip()
+        with _lock:
+            asset = _assets.get(asset_id)
+            if not asset or server_id not in asset.issued or not _registered(server_id, nym_id):
+                return ""
+            account = _Account(_new_id(), server_id, nym_id, asset_id)
+            _accounts[account._id] = account
+            return _message("registerAccountResponse", accountID=account._id,
+                            nymID=nym_id, notaryID=server_id)
+
+    def send_transfer(self, server_id, nym_id, from_account_id, to_account_id, amount, note):
+        _round_trip()
+        with _lock:
+            source = _owned_account(server_id, nym_id, from_account_id)
+            target = _accounts.get(to_account_id)
+            if not source or not target or target.server_id != server_id \
+                    or target.asset_id != source.asset_id or amount <= 0 \
+                    or not source.can_hold(source.balance - amount):
+                return ""
+            number = _use_transaction_number(server_id, nym_id)
+            source.balance -= amount
+            source.wallet_balance = source.balance
+            target.inbox.append(amount)
+            return _message("notarizeTransactionResponse", transactionNum=number,
+                            accountID=from_account_id, nymID=nym_id, notaryID=server_id)
+
+    def accept_inbox_items(self, account_id, item_type, indices):
+        _round_trip()
+        with _lock:
+            account = _accounts.get(account_id)
+            if not account or not _registered(account.server_id, account.nym_id) \
+                    or not account.can_hold(account.balance + sum(account.inbox)):
+                return False
+            if account.inbox:
+                _use_transaction_number(account.server_id, account.nym_id)
+                account.balance += sum(account.inbox)
+                account.inbox = []
+            account.wallet_balance = account.balance
+            return True
+
+    def deposit_cheque(self, server_id, nym_id, account_id, body):
+        _round_trip()
+        with _lock:
+            instrument = _instrument(body)
+            account = _owned_account(server_id, nym_id, account_id)
+            if not instrument or instrument.used or instrument.server_id != server_id \
+                    or not account or instrument.amount == 0 \
+                    or account.asset_id != instrument.account.asset_id \
+                    or instrument.recipient_id not in ("", nym_id) \
+                    or not instrument.valid_from <= time.time() <= instrument.valid_to \
+                    or not account.can_hold(account.balance + instrument.amount):
+                return ""
+            if instrument.kind == "cheque":
+                drawer = instrument.account
+                if drawer._id not in _accounts \
+                        or not drawer.can_hold(drawer.balance - instrument.amount):
+                    return ""
+                drawer.balance -= instrument.amount
+            number = _use_transaction_number(server_id, nym_id)
+            instrument.used = True
+            account.balance += instrument.amount
+            account.wallet_balance = account.balance
+            return _message("notarizeTransactionResponse", transactionNum=number,
+                            accountID=account_id, nymID=nym_id, notaryID=server_id)
+
+    def withdraw_voucher(self, server_id, nym_id, account_id, recipient_nym_id, memo, amount):
+        _round_trip()
+        with _lock:
+            account = _owned_account(server_id, nym_id, account_id)
+            if not account or amount <= 0 or not account.can_hold(account.balance - amount):
+                return ""
+            number = _use_transaction_number(server_id, nym_id)
+            now = int(time.time())
+            voucher = _Instrument("voucher", number, server_id, amount, account, nym_id,
+                                  recipient_nym_id, now - 1, now + 365 * 24 * 3600, memo)
+            _instruments[number] = voucher
+            account.balance -= amount
+            account.wallet_balance = account.balance
+            return _message("notarizeTransactionResponse", transactionNum=number,
+                            accountID=account_id, nymID=nym_id, notaryID=server_id)
+
+    def send_user_payment(self, server_id, nym_id, recipient_nym_id, body):
+        _round_trip()
+        with _lock:
+            if not _registered(server_id, nym_id) or not _instrument(body):
+                return ""
+            # the sender keeps a copy in the outpayments box
+            _nyms[nym_id].outpayments.append(body)
+            return _message("sendNymInstrumentResponse", nymID=nym_id,
+                            nymID2=recipient_nym_id, notaryID=server_id)
+
+    def cancel_outgoing_payments(self, nym_id, account_id, indices):
+        _round_trip()
+        with _lock:
+            nym = _nyms.get(nym_id)
+            try:
+                positions = sorted(set(int(i) for i in indices.split(",")), reverse=True)
+            except ValueError:
+                return False
+            if not nym or not all(0 <= i < len(nym.outpayments) for i in positions):
+                return False
+            for i in positions:
+                instrument = _instrument(nym.outpayments.pop(i))
+                if instrument and not instrument.used:
+                    instrument.used = True
+                    if instrument.kind == "voucher":
+                        # the funds go back to the account the voucher was withdrawn from
+                        instrument.account.balance += instrument.amount
+            return True
+
+    def create_market_offer(self, asset_account_id, currency_account_id, scale, min_increment,
+                            quantity, price, selling, lifespan, stop_sign, activation_price):
+        # imported here since this module is imported by pyopentxs itself
+        from pyopentxs import market
+        _round_trip()
+        with _lock:
+            asset_account = _accounts.get(asset_account_id)
+            currency_account = _accounts.get(currency_account_id)
+            if not asset_account or not currency_account \
+                    or asset_account.nym_id != currency_account.nym_id \
+                    or asset_account.server_id != currency_account.server_id \
+                    or not _registered(asset_account.server_id, asset_account.nym_id) \
+                    or quantity <= 0 or scale <= 0 or min_increment <= 0:
+                return ""
+            number = _use_transaction_number(asset_account.server_id, asset_account.nym_id)
+            if stop_sign:
+                _stop_offers.append((number, asset_account_id, currency_account_id, scale,
+                                     min_increment, quantity, price, selling))
+            else:
+                order = market.Order(asset_account_id, currency_account_id,
+                                     (asset_account.server_id, asset_account.asset_id,
+                                      currency_account.asset_id, scale),
+                                     quantity, price, selling, scale, min_increment)
+                order.number = number
+                order.date = int(time.time())
+                _trade(order)
+            return _message("notarizeTransactionResponse", transactionNum=number,
+                            accountID=asset_account_id, nymID=asset_account.nym_id,
+                            notaryID=asset_account.server_id)
+
+    def get_market_list(self, server_id, nym_id):
+        _round_trip()
+        with _lock:
+            if not _registered(server_id, nym_id):
+                return ""
+            engine = _market[0]
+            markets = []
+            for market in (engine.books if engine else []):
+                if market[0] != server_id:
+                    continue
+                bids, asks = engine.bids(market), engine.asks(market)
+                trades = _trades.get(market)
+                markets.append(_Stored(
+                    market_id=_market_id(market), instrument_definition_id=market[1],
+                    currency_type_id=market[2], scale=market[3], number_bids=len(bids),
+                    number_asks=len(asks), current_bid=bids[0].price if bids else 0,
+                    current_ask=asks[0].price if asks else 0,
+                    last_sale_price=trades[-1][2] if trades else 0))
+            _downloads[("markets", server_id, "market_data.bin", "")] = MarketList(markets)
+            return _message("getMarketListResponse", notaryID=server_id, nymID=nym_id)
+
+    def get_market_offers(self, server_id, nym_id, market_id, max_depth):
+        _round_trip()
+        with _lock:
+            market = _market_by_id(server_id, market_id)
+            if not _registered(server_id, nym_id) or not market or max_depth <= 0:
+                return ""
+
+            def entries(orders):
+                return [_Stored(transaction_id=o.number, price_per_scale=o.price,
+                                available_assets=o.remaining, minimum_increment=o.min_increment,
+                                date=o.date) for o in orders[:max_depth]]
+            _downloads[("markets", server_id, "offers", market_id + ".bin")] = OfferListMarket(
+                entries(_market[0].bids(market)), entries(_market[0].asks(market)))
+            return _message("getMarketOffersResponse", notaryID=server_id, nymID=nym_id,
+                            marketID=market_id, depth=max_depth)
+
+    def get_market_recent_trades(self, server_id, nym_id, market_id):
+        _round_trip()
+        with _lock:
+            market = _market_by_id(server_id, market_id)
+            if not _registered(server_id, nym_id) or not market:
+                return ""
+            trades = [_Stored(transaction_id=number, date=date, price=price, amount_sold=quantity)
+                      for number, date, price, quantity in _trades.get(market, [])]
+            _downloads[("markets", server_id, "recent", market_id + ".bin")] = TradeListMarket(
+                trades)
+            return _message("getMarketRecentTradesResponse", notaryID=server_id, nymID=nym_id,
+                            marketID=market_id)
+
+
+# market data storage, as read by the client after the downloads above
+
+STORED_OBJ_MARKET_LIST = "MarketList"
+STORED_OBJ_OFFER_LIST_MARKET = "OfferListMarket"
+STORED_OBJ_TRADE_LIST_MARKET = "TradeListMarket"
+
+
+class _Stored:
+    '''A stored record, with string fields like OTDB's'''
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, str(value))
+
+
+class MarketList:
+    def __init__(self, markets):
+        self._markets = markets
+
+    def GetMarketDataCount(self):
+        return len(self._markets)
+
+    def GetMarketData(self, i):
+        return self._markets[i]
+
+    @classmethod
+    def ot_dynamic_cast(cls, storable):
+        return storable if isinstance(storable, cls) else None
+
+
+class OfferListMarket:
+    def __init__(self, bids, asks):
+        self._bids = bids
+        self._asks = asks
+
+    def GetBidDataCount(self):
+        return len(self._bids)
+
+    def GetBidData(self, i):
+        return self._bids[i]
+
+    def GetAskDataCount(self):
+        return len(self._asks)
+
+    def GetAskData(self, i):
+        return self._asks[i]
+
+    @classmethod
+    def ot_dynamic_cast(cls, storable):
+        return storable if isinstance(storable, cls) else None
+
+
+class TradeListMarket:
+    def __init__(self, trades):
+        self._trades = trades
+
+    def GetTradeDataMarketCount(self):
+        return len(self._trades)
+
+    def GetTradeDataMarket(self, i):
+        return self._trades[i]
+
+    @classmethod
+    def ot_dynamic_cast(cls, storable):
+        return storable if isinstance(storable, cls) else None
+
+
+def QueryObject(object_type, folder, one="", two="", three=""):
+    with _lock:
+        return _downloads.get((folder, one, two, three))
@@ -1,5 +1,7 @@
 import pyopentxs
+from pyopentxs import nym
 import pytest
+import os
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -8,5 +10,22 @@ def initialize_pyopentxs():
     this will have already been called (along with cleaning the ot config dir)
     but calling it again appears to be harmless.
 
+    When runtests.py runs the tests in several pytest-xdist workers, each
+    worker starts its own notary and client home here instead.
+
+    PYOPENTXS_NYM_POOL nyms (4 by default) are kept created ahead of
+    time, see nym.NymPool.
     '''
-    pyopentxs.init()
+    root = os.environ.get("PYOPENTXS_WORKER_ROOT")
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if root and worker:
+        from pyopentxs import localnet
+        snapshot = os.environ.get("PYOPENTXS_SNAPSHOT")
+        localnet.start_isolated(root, worker, bool(snapshot), snapshot == "links")
+    else:
+        pyopentxs.init()
+    pool_size = int(os.environ.get("PYOPENTXS_NYM_POOL", "4"))
+    if pool_size:
+        nym.pool.start(pool_size)
+    yield
+    nym.pool.stop()
@@ -1,6 +1,7 @@
+from pyopentxs import ReturnValueError
 from pyopentxs.nym import Nym
 from pyopentxs.asset import Asset
-from pyopentxs.account import Account
+from pyopentxs.account import Account, balances
 from pyopentxs.instrument import transfer
 
 btc_contract_file = "../test-data/sample-contracts/btc.xml"
@@ -26,12 +27,62 @@ class TransferAccounts:
         return self
 
     def assert_balances(self, issuer, source, target):
-        assert (issuer, source, target) == (self.issuer.balance(),
-                                            self.source.balance(),
-                                            self.target.balance()),\
+        fetched = balances([self.issuer, self.source, self.target])
+        assert (issuer, source, target) == (fetched[self.issuer._id],
+                                            fetched[self.source._id],
+                                            fetched[self.target._id]),\
             "Issuer/source/target balances do not match."
 
 
+class TransferAccountsPool:
+    '''TransferAccounts with the initial balance, reused between tests.
+       A test takes a set and gives it back when done; the balances are
+       then moved back to 100 in the source account.  Sets that can't be
+       restored are thrown away and replaced by new ones.'''
+
+    def __init__(self, balance=100):
+        self.balance = balance
+        self.free = []
+        self.created = 0
+        self.discarded = 0
+
+    def take(self):
+        if self.free:
+            return self.free.pop()
+        self.created += 1
+        return TransferAccounts().initial_balance(self.balance)
+
+    def give_back(self, accts):
+        try:
+            restored = self.restore(accts)
+        except (Exception, ReturnValueError):
+            restored = False
+        if restored:
+            self.free.append(accts)
+        else:
+            self.discarded += 1
+
+    def restore(self, accts):
+        '''Move the funds back to the initial balance, return whether that
+           worked'''
+        fetched = balances([accts.issuer, accts.source, accts.target])
+        target = fetched[accts.target._id]
+        source = fetched[accts.source._id]
+        if target < 0 or source + target + fetched[accts.issuer._id] != 0:
+            # funds are held elsewhere, e.g. in an outstanding voucher
+            return False
+        # everything goes through the issuer, whose balance can't overflow
+        if target:
+            transfer(target, accts.target, accts.issuer)
+        if source > self.balance:
+            transfer(source - self.balance, accts.source, accts.issuer)
+        elif source < self.balance:
+            transfer(self.balance - source, accts.issuer, accts.source)
+        fetched = balances([accts.issuer, accts.source, accts.target])
+        return (fetched[accts.issuer._id], fetched[accts.source._id],
+                fetched[accts.target._id]) == (-self.balance, self.balance, 0)
+
+
 class TradeAccount:
     def __init__(self, nym, asset1, asset2):
         self.nym = nym
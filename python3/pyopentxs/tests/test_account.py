@@ -1,6 +1,7 @@
 from pyopentxs.nym import Nym
 from pyopentxs.asset import Asset
-from pyopentxs import account, error, ReturnValueError, server
+from pyopentxs import account, error, nym, ReturnValueError, server, wallet
+from pyopentxs.instrument import transfer
 from pyopentxs.tests import data
 import pytest
 
@@ -54,7 +55,82 @@ def test_create_account_nonexistent_asset():
         acct.create()
 
 
+def test_cached_balance():
+    accounts = data.TransferAccounts().initial_balance()
+    source = account.Account(accounts.asset, accounts.source.nym, _id=accounts.source._id,
+                             max_age=3600)
+    assert source.balance() == 100
+    fetched = account._fetched[source._id]
+    assert source.balance() == 100
+    assert account._fetched[source._id] == fetched, "cached balance was refreshed"
+    transfer(10, source, accounts.target)
+    assert source._id not in account._fetched
+    assert source.balance() == 90
+
+
+def test_balances():
+    accounts = data.TransferAccounts().initial_balance()
+    second = account.Account(accounts.asset, accounts.source.nym).create()
+    fetched = account.balances([accounts.issuer, accounts.source, second, accounts.target])
+    assert fetched == {accounts.issuer._id: -100,
+                       accounts.source._id: 100,
+                       second._id: 0,
+                       accounts.target._id: 0}
+
+
+def test_balances_refresh_cached():
+    '''balances() downloads every account, even with a fresh cached balance'''
+    accounts = data.TransferAccounts().initial_balance()
+    source = account.Account(accounts.asset, accounts.source.nym, _id=accounts.source._id,
+                             max_age=3600)
+    assert source.balance() == 100
+    fetched = account._fetched[source._id]
+    assert account.balances([source]) == {source._id: 100}
+    assert account._fetched[source._id] > fetched
+
+
 @pytest.mark.skipif(True, reason="https://github.com/Open-Transactions/opentxs/issues/364")
 def test_delete_account(an_account):
     an_account.create()
     an_account.delete()
+
+
+def test_wallet_index(an_account):
+    an_account.create()
+    info = wallet.index.account(an_account._id)
+    assert (info.nym_id, info.asset_id, info.server_id) == \
+        (an_account.nym._id, an_account.asset._id, an_account.server_id)
+    assert an_account._id in wallet.index.account_ids_of_nym(an_account.nym._id)
+    assert set(wallet.index.account_ids_of_asset(an_account.asset._id)) == \
+        set([an_account._id, an_account.asset.issuer_account._id])
+    assert wallet.index.asset_name(an_account.asset._id) == "Bitcoins"
+    # the index agrees with the wallet when loaded from scratch
+    ids = set(account.get_all_ids())
+    wallet.index.invalidate()
+    assert set(account.get_all_ids()) == ids
+
+
+def test_lazy_account_nym(an_account):
+    '''An account without a nym only registers one when it's needed'''
+    acct = account.Account(an_account.asset)
+    assert acct._nym is None
+    acct.create()
+    assert acct._nym._id in wallet.index.nym_ids()
+    assert acct.balance() == 0
+
+
+def test_account_from_id(an_account):
+    an_account.create()
+    acct = account.Account(_id=an_account._id)
+    assert acct.nym._id == an_account.nym._id
+    assert acct.asset._id == an_account.asset._id
+    assert acct.server_id == an_account.server_id
+    assert acct.balance() == 0
+
+
+def test_account_from_unknown_id():
+    '''An account id not in the wallet doesn't get a new nym'''
+    acct = account.Account(_id="not an account id")
+    with pytest.raises(ValueError):
+        acct.nym
+    assert acct._nym is None
@@ -0,0 +1,79 @@
+from pyopentxs import aio, nym_lock
+from pyopentxs.account import Account
+from pyopentxs.nym import Nym
+from pyopentxs.tests import data
+from pyopentxs.tests.test_client_server import new_cheque, new_voucher
+import asyncio
+import threading
+
+
+def run(coroutine):
+    # a new event loop each time
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_transfers():
+    accounts = data.TransferAccounts().initial_balance()
+
+    async def scenario():
+        nyms = await asyncio.gather(*[aio.register(Nym()) for _ in range(3)])
+        targets = await asyncio.gather(
+            *[aio.create_account(Account(accounts.asset, nym)) for nym in nyms])
+        # all from the same source nym, so these run one after another
+        await asyncio.gather(*[aio.transfer(10, accounts.source, t) for t in targets])
+        return await asyncio.gather(*[aio.balance(a) for a in [accounts.source] + targets])
+
+    assert run(scenario()) == [70, 10, 10, 10]
+
+
+def test_cheque_and_voucher():
+    accounts = data.TransferAccounts().initial_balance()
+    cheque = new_cheque(accounts.source, accounts.target, 10)
+    voucher = new_voucher(accounts.source, accounts.target, 20)
+
+    async def scenario():
+        await aio.write_cheque(cheque)
+        await aio.withdraw_voucher(voucher)
+        await asyncio.gather(aio.deposit_cheque(cheque, accounts.target.nym, accounts.target),
+                             aio.deposit_voucher(voucher, accounts.target.nym, accounts.target))
+
+    run(scenario())
+    accounts.assert_balances(-100, 70, 30)
+
+
+def test_nym_lock_shared_with_blocking_calls():
+    '''A request waits for the nym's blocking calls in other threads'''
+    accounts = data.TransferAccounts().initial_balance()
+    lock = nym_lock(accounts.source.server_id, accounts.source.nym._id)
+
+    async def scenario():
+        lock.acquire()
+        try:
+            balance = asyncio.ensure_future(aio.balance(accounts.source))
+            await asyncio.sleep(0.1)
+            assert not balance.done()
+        finally:
+            lock.release()
+        return await balance
+
+    assert run(scenario()) == 100
+
+
+def test_create_account_registers_nym(monkeypatch):
+    '''The nym of an account without one is registered in the worker'''
+    accounts = data.TransferAccounts().initial_balance()
+    acct = Account(accounts.asset)
+    threads = []
+    register = Nym.register
+
+    def recording_register(self, *args):
+        threads.append(threading.current_thread())
+        return register(self, *args)
+    monkeypatch.setattr(Nym, "register", recording_register)
+
+    async def scenario():
+        await aio.create_account(acct)
+        return await aio.balance(acct)
+
+    assert run(scenario()) == 0
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,36 @@
+from pyopentxs import bench
+from pyopentxs import error
+import time
+
+
+def test_parse_mix():
+    assert bench.parse_mix("transfer=2,cheque") == {"transfer": 2, "cheque": 1}
+    with error.expected(ValueError):
+        bench.parse_mix("transfer,invoice=1")
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert [bench.percentile(values, p) for p in [50, 95, 99, 100]] == [50, 95, 99, 100]
+    assert bench.percentile([], 50) is None
+
+
+def test_closed_loop():
+    pairs = bench.setup_pairs(2, 10 ** 12)
+    flows = bench.run(bench.parse_mix("transfer,cheque,voucher"), pairs, 2, seed=1)
+    assert set(flows) <= set(bench.FLOWS)
+    assert sum(f["ops"] for f in flows.values()) > 0
+    assert all(f["errors"] == 0 for f in flows.values())
+
+
+def test_open_loop_drops_when_behind(monkeypatch):
+    '''Payments due while every pair is busy are dropped, not queued'''
+    def slow_pay(recorder, flow, pair, amount, scheduled):
+        time.sleep(0.1)
+        recorder.record(flow, time.perf_counter() - scheduled, True)
+    monkeypatch.setattr(bench, "_pay", slow_pay)
+    start = time.perf_counter()
+    flows = bench.run({"transfer": 1}, [("source", "target")], 0.5, rate=100, seed=1)
+    assert time.perf_counter() - start < 1
+    assert flows["transfer"]["dropped"] > 0
+    assert 0 < flows["transfer"]["ops"] <= 6
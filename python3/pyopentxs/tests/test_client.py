@@ -1,5 +1,9 @@
-from pyopentxs import server, nym
+from pyopentxs import server, notary, nym, wallet
+import io
+import opentxs
+import pyopentxs
 import pytest
+import shutil
 
 pytest.mark.usefixtures("setup_ot_config")
 
@@ -15,3 +19,94 @@ def test_list_servers():
     servers = server.get_all()
     assert servers != []
     assert servers[0][1] == "Transactions.com"  # from localhost.xml server contract
+
+
+def test_server_registry():
+    servers = server.get_all()
+    server_id, server_name = servers[0]
+    assert server.name(server_id) == server_name
+    assert server_id in server.ids_by_name(server_name)
+    assert server.name("not a server id") is None
+    # the cached list can't be changed by the caller
+    servers.pop()
+    assert server.get_all() != servers
+
+
+def test_decode_file_cache(tmpdir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(opentxs, "OTAPI_Wrap_Decode",
+                        lambda encoded, line_breaks: calls.append(encoded) or encoded.upper())
+    path = str(tmpdir.join("contract"))
+    with open(path, "w") as f:
+        f.write("contract")
+    assert pyopentxs.decode_file(path) == "CONTRACT"
+    assert pyopentxs.decode_file(path) == "CONTRACT"
+    assert len(calls) == 1
+    # a changed file is decoded again
+    with open(path, "w") as f:
+        f.write("new contract")
+    assert pyopentxs.decode_file(path) == "NEW CONTRACT"
+    assert len(calls) == 2
+
+
+def test_parsed_wallet(tmpdir, monkeypatch):
+    monkeypatch.setattr(opentxs, "OTAPI_Wrap_Decode", lambda encoded, line_breaks: encoded)
+    path = str(tmpdir.join("wallet.xml"))
+    with open(path, "w") as f:
+        f.write('<wallet name="" version="2.0">\n<cachedKey>\n KEY\n</cachedKey>\n'
+                '<pseudonym name="alice" nymID="N1"/>\n'
+                '<notaryProvider name="notary" notaryID="S1"/>\n'
+                '<assetType name="gold" instrumentDefinitionID="A1"/>\n</wallet>\n')
+    parsed = wallet.parsed(path)
+    assert parsed.cached_key == "KEY"
+    assert (parsed.nyms, parsed.servers, parsed.assets) \
+        == ({"N1": "alice"}, {"S1": "notary"}, {"A1": "gold"})
+    assert wallet.parsed(path) is parsed
+
+
+def test_init_once(monkeypatch):
+    assert pyopentxs.state == "loaded"
+    assert set(pyopentxs.init_seconds) == {"AppInit", "LoadWallet"}
+    calls = []
+    monkeypatch.setattr(opentxs, "OTAPI_Wrap_LoadWallet", lambda: calls.append(1))
+    pyopentxs.init()
+    assert calls == []
+    pyopentxs.init(reload=True)
+    assert calls == [1]
+
+
+def test_notary_setup_twice(tmpdir, monkeypatch):
+    '''Every setup loads the wallet of the config dir it starts from'''
+    loads = []
+    monkeypatch.setattr(opentxs, "OTAPI_Wrap_LoadWallet", lambda: loads.append(1))
+    monkeypatch.setattr(notary, "make_server_contract",
+                        lambda contract, server_nym: ("S1", "KEY", "CONTRACT"))
+    monkeypatch.setattr(server, "add_contract", lambda contract: True)
+    monkeypatch.setattr(server, "active", [])
+    monkeypatch.setattr(pyopentxs, "config_dir", str(tmpdir) + "/")
+    for _ in range(2):
+        tmpdir.ensure("client_data/credentials", dir=True)
+        shutil.rmtree(str(tmpdir.join("server_data")), ignore_errors=True)
+        notary.setup(io.StringIO("<notaryServer/>"))
+    # before and after the client data is removed, by both setups
+    assert len(loads) == 4
+
+
+def test_fake_server_contracts_cached(tmpdir, monkeypatch):
+    '''The contracts of the fake servers are only signed once per process'''
+    signers = []
+
+    def add(nym_id, contract):
+        signers.append(nym_id)
+        contract_id = "C{}".format(len(signers))
+        tmpdir.ensure("client_data/contracts", dir=True).join(contract_id).write(contract)
+        return contract_id
+    monkeypatch.setattr(server, "add", add)
+    monkeypatch.setattr(opentxs, "OTAPI_Wrap_Decode", lambda encoded, line_breaks: encoded)
+    monkeypatch.setattr(pyopentxs, "config_dir", str(tmpdir) + "/")
+    # unique to this test, so nothing is cached yet
+    contract = '<notaryServer name="{}"/>'.format(tmpdir)
+    first = [notary.make_fake_server_contract(contract, i) for i in [1, 2]]
+    again = [notary.make_fake_server_contract(contract, i) for i in [1, 2]]
+    assert first == again == [contract, contract]
+    assert len(signers) == 2
@@ -1,7 +1,11 @@
 from pyopentxs.tests import data
+from pyopentxs import market, metrics
+from pyopentxs.account import balances
+from pyopentxs.market import (create_offer, wait_until_settled, place_all, MatchingEngine,
+                              Offer, Order)
 import pyopentxs
 import pytest
-import time
+import random
 
 cron_interval = 30
 
@@ -13,51 +17,131 @@ def marketaccounts():
     return marketaccounts
 
 
+def assert_settled(alice, bob, balances):
+    '''Wait for the market cron to settle the trades, balances are
+       (alice1, alice2, bob1, bob2)'''
+    wait_until_settled([alice.account1, alice.account2, bob.account1, bob.account2],
+                       balances, timeout=2 * cron_interval)
+
+
 def test_immediate_trade(marketaccounts):
     '''Create two offers at the same price so that the trade should
        execute immediately.'''
     alice = marketaccounts.alice
     bob = marketaccounts.bob
-    pyopentxs.otme.create_market_offer(alice.account1._id, alice.account2._id,
-                                       1, 1, 3, 7, True, 10000, "", 0)
-    pyopentxs.otme.create_market_offer(bob.account1._id, bob.account2._id,
-                                       1, 1, 3, 7, False, 10000, "", 0)
-    time.sleep(cron_interval)
-    assert(alice.account1.balance() == 97)
-    assert(alice.account2.balance() == 121)
-    assert(bob.account1.balance() == 103)
-    assert(bob.account2.balance() == 79)
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 7, True)
+    create_offer(bob.account1, bob.account2, 1, 1, 3, 7, False)
+    assert_settled(alice, bob, [97, 121, 103, 79])
 
 
 def test_bid_market_price(marketaccounts):
     '''Test that a bid at market price takes the existing orders correctly'''
     alice = marketaccounts.alice
     bob = marketaccounts.bob
-    pyopentxs.otme.create_market_offer(alice.account1._id, alice.account2._id,
-                                       1, 1, 3, 7, True, 10000, "", 0)
-    pyopentxs.otme.create_market_offer(alice.account1._id, alice.account2._id,
-                                       1, 1, 3, 8, True, 10000, "", 0)
-    pyopentxs.otme.create_market_offer(bob.account1._id, bob.account2._id,
-                                       1, 1, 4, 0, False, 10000, "", 0)
-    time.sleep(cron_interval)
-    assert(alice.account1.balance() == 96)
-    assert(alice.account2.balance() == 129)  # 3 at 7 and 1 at 8
-    assert(bob.account1.balance() == 104)
-    assert(bob.account2.balance() == 71)
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 7, True)
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 8, True)
+    create_offer(bob.account1, bob.account2, 1, 1, 4, 0, False)
+    # alice2: 3 at 7 and 1 at 8
+    assert_settled(alice, bob, [96, 129, 104, 71])
 
 
 def test_ask_market_price(marketaccounts):
     '''Test that an ask at market price takes the existing orders correctly'''
     alice = marketaccounts.alice
     bob = marketaccounts.bob
-    pyopentxs.otme.create_market_offer(bob.account1._id, bob.account2._id,
-                                       1, 1, 3, 7, False, 10000, "", 0)
-    pyopentxs.otme.create_market_offer(bob.account1._id, bob.account2._id,
-                                       1, 1, 3, 8, False, 10000, "", 0)
-    pyopentxs.otme.create_market_offer(alice.account1._id, alice.account2._id,
-                                       1, 1, 4, 0, True, 10000, "", 0)
-    time.sleep(cron_interval)
-    assert(alice.account1.balance() == 96)
-    assert(alice.account2.balance() == 131)  # 3 at 8 and 1 at 7
-    assert(bob.account1.balance() == 104)
-    assert(bob.account2.balance() == 69)
+    create_offer(bob.account1, bob.account2, 1, 1, 3, 7, False)
+    create_offer(bob.account1, bob.account2, 1, 1, 3, 8, False)
+    create_offer(alice.account1, alice.account2, 1, 1, 4, 0, True)
+    # alice2: 3 at 8 and 1 at 7
+    assert_settled(alice, bob, [96, 131, 104, 69])
+
+
+def test_matching_engine():
+    '''The reference engine agrees with the trades worked out above'''
+    market = ("asset", "currency", 1)
+    engine = MatchingEngine({"a1": 100, "a2": 100, "b1": 100, "b2": 100})
+    engine.submit(Order("b1", "b2", market, 3, 7, False))
+    engine.submit(Order("b1", "b2", market, 3, 8, False))
+    fills = engine.submit(Order("a1", "a2", market, 4, 0, True))
+    assert [(f.quantity, f.price) for f in fills] == [(3, 8), (1, 7)]
+    assert engine.balances == {"a1": 96, "a2": 131, "b1": 104, "b2": 69}
+    assert [o.remaining for o in engine.bids(market)] == [2]
+    assert engine.asks(market) == []
+
+
+@pytest.mark.skipif(pyopentxs.backend == "simulated",
+                    reason="the simulated notary trades with the reference engine itself")
+def test_random_offers(marketaccounts):
+    '''A random stream of offers settles as the reference engine predicts.
+       The engine matches every offer as it comes, while the notary's cron
+       matches the offers placed since its last run in a batch, so each
+       offer is left to settle before the next one is placed.'''
+    rng = random.Random(4)
+    traders = [marketaccounts.alice, marketaccounts.bob, marketaccounts.charlie]
+    accounts = [a for t in traders for a in [t.account1, t.account2]]
+    engine = MatchingEngine(balances(accounts))
+    offers = []
+    for _ in range(60):
+        trader = rng.choice(traders)
+        offers.append(Offer(trader.account1, trader.account2, rng.randint(1, 5),
+                            rng.randint(5, 10), rng.random() < 0.5))
+    for offer in offers:
+        assert place_all([offer], workers=1)[0].error is None
+        engine.submit(offer.order())
+        wait_until_settled(accounts, [engine.balances[a._id] for a in accounts],
+                           timeout=2 * cron_interval)
+    assert engine.trades
+
+
+def test_read_market(marketaccounts):
+    alice = marketaccounts.alice
+    bob = marketaccounts.bob
+    server_id = alice.account1.server_id
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 7, True)
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 9, True)
+    create_offer(bob.account1, bob.account2, 1, 1, 1, 7, False)
+    create_offer(bob.account1, bob.account2, 1, 1, 2, 5, False)
+    assert_settled(alice, bob, [99, 107, 101, 93])
+
+    info = market.find_market(server_id, bob.nym, marketaccounts.asset1._id,
+                              marketaccounts.asset2._id)
+    assert (info.bids, info.asks, info.last_price) == (1, 2, 7)
+    asks = list(market.offers(server_id, bob.nym, info._id, True, page_size=1))
+    assert [(a.quantity, a.price) for a in asks] == [(2, 7), (3, 9)]
+    bids = list(market.offers(server_id, bob.nym, info._id, False))
+    assert [(b.quantity, b.price) for b in bids] == [(2, 5)]
+    assert [(t.quantity, t.price) for t in market.trades(server_id, bob.nym, info._id)] \
+        == [(1, 7)]
+
+    # served from the cache until an offer is placed
+    with metrics.recording() as stats:
+        assert market.find_market(server_id, bob.nym, marketaccounts.asset1._id,
+                                  marketaccounts.asset2._id).last_price == 7
+        assert len(market.trades(server_id, bob.nym, info._id)) == 1
+    assert not [name for name in stats.functions if name.startswith("OT_ME.get_market")]
+    create_offer(bob.account1, bob.account2, 1, 1, 3, 9, False)
+    # 2 at 7 and 1 at 9
+    assert_settled(alice, bob, [96, 130, 104, 70])
+    assert market.find_market(server_id, bob.nym, marketaccounts.asset1._id,
+                              marketaccounts.asset2._id).last_price == 9
+
+
+def test_read_offers_book_changed(marketaccounts):
+    '''An offer placed between two pages of the book isn't read twice'''
+    alice = marketaccounts.alice
+    bob = marketaccounts.bob
+    server_id = alice.account1.server_id
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 7, True)
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 9, True)
+    create_offer(bob.account1, bob.account2, 1, 1, 1, 7, False)
+    assert_settled(alice, bob, [99, 107, 101, 93])
+
+    info = market.find_market(server_id, bob.nym, marketaccounts.asset1._id,
+                              marketaccounts.asset2._id)
+    asks = market.offers(server_id, bob.nym, info._id, True, page_size=1)
+    assert next(asks).price == 7
+    # better than the ask already read, so the next page starts with it
+    create_offer(alice.account1, alice.account2, 1, 1, 3, 6, True)
+    prices = [a.price for a in asks]
+    assert 7 not in prices
+    assert 9 in prices
@@ -0,0 +1,48 @@
+from pyopentxs import message
+
+signed_reply = '''-----BEGIN SIGNED MESSAGE-----
+Hash: SHA256
+
+<?xml version="1.0"?>
+<OTmessage version="2.0" dateSigned="1420070400">
+
+<registerAccountResponse
+ requestNum="5"
+ success="true"
+ accountID="ACCT"
+ nymID="NYM"
+ notaryID="NOTARY" >
+<accountLedger>
+- -----BEGIN OT ARMORED LEDGER-----
+</accountLedger>
+</registerAccountResponse>
+</OTmessage>
+-----BEGIN MESSAGE SIGNATURE-----
+Meta:    kMHs
+-----END MESSAGE SIGNATURE-----
+'''
+
+
+def test_account_reply():
+    reply = message.account_reply(signed_reply)
+    assert (reply.success, reply.account_id, reply.nym_id, reply.server_id) \
+        == (True, "ACCT", "NYM", "NOTARY")
+
+
+def test_account_reply_old_name():
+    reply = message.account_reply(
+        '<OTmessage><createAccountResponse success="true" accountID="A" serverID="S"/>'
+        '</OTmessage>')
+    assert (reply.account_id, reply.server_id) == ("A", "S")
+
+
+def test_stops_at_element():
+    # what comes after the element is never parsed
+    xml = '<OTmessage><registerAccountResponse accountID="A"/>' + '<broken' * 10000
+    assert message.account_reply(xml).account_id == "A"
+
+
+def test_no_reply():
+    assert message.account_reply("") is None
+    assert message.account_reply("<OTmessage><pingNotaryResponse/></OTmessage>") is None
+    assert message.account_reply("<OTmessage><unclosed") is None
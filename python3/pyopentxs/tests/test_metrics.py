@@ -0,0 +1,38 @@
+from pyopentxs import metrics, wallet
+from pyopentxs.nym import Nym
+import json
+import pytest
+import opentxs
+
+
+def test_recording():
+    original = opentxs.OTAPI_Wrap_GetNym_Name
+    # keep the wallet index from looking up the name of the new nym
+    wallet.index.invalidate()
+    with metrics.recording() as stats:
+        nym = Nym().register()
+        nym.get_name()
+    nym.get_name()
+    assert opentxs.OTAPI_Wrap_GetNym_Name is original
+    assert stats.functions["OTAPI_Wrap_GetNym_Name"]["calls"] == 1
+    assert stats.functions["OT_ME.register_nym"]["calls"] == 1
+    assert stats.functions["OT_ME.register_nym"]["bytes_out"] > 0
+    assert "OT_ME.register_nym" in json.loads(stats.to_json())["functions"]
+    assert 'opentxs_call_seconds_count{function="OT_ME.register_nym"} 1' \
+        in stats.to_prometheus()
+
+
+def test_recording_errors(monkeypatch):
+    '''Calls that raise are counted, and as errors'''
+    def failing(nym_id):
+        raise RuntimeError("no such nym")
+    monkeypatch.setattr(opentxs, "OTAPI_Wrap_GetNym_Name", failing)
+    with metrics.recording() as stats:
+        with pytest.raises(RuntimeError):
+            opentxs.OTAPI_Wrap_GetNym_Name("nym")
+        opentxs.OTAPI_Wrap_GetNymCount()
+    assert stats.functions["OTAPI_Wrap_GetNym_Name"]["calls"] == 1
+    assert stats.functions["OTAPI_Wrap_GetNym_Name"]["errors"] == 1
+    assert stats.functions["OTAPI_Wrap_GetNymCount"]["errors"] == 0
+    assert 'opentxs_call_errors_total{function="OTAPI_Wrap_GetNym_Name"} 1' \
+        in stats.to_prometheus()
@@ -3,6 +3,7 @@ from pyopentxs.tests import data
 from pyopentxs import error, nym, ReturnValueError, server
 import pyopentxs
 import pytest
+import time
 
 
 def test_register_nym():
@@ -32,8 +33,8 @@ string_returnchar = lambda: "\n"
 @pytest.mark.parametrize(
     "newname",
     ["Bob",
-     pytest.mark.skipif(True,
-                        reason="https://github.com/Open-Transactions/opentxs/issues/400")(("",)),
+     pytest.param("", marks=pytest.mark.skipif(
+         True, reason="https://github.com/Open-Transactions/opentxs/issues/400")),
      string_returnchar,
      string_overflow,
      "我能吞下玻璃而不伤身体"])
@@ -76,6 +77,55 @@ def test_delete_issuer_nym(prepared_accounts):
         prepared_accounts.issuer.nym.delete()
 
 
+def test_nym_pool():
+    pool = nym.NymPool().start(2)
+    try:
+        while pool.available() < 2:
+            time.sleep(0.1)
+        pooled_ids = list(pool._ready)
+        nym.pool, orig_pool = pool, nym.pool
+        try:
+            created = [Nym().create()._id for _ in range(3)]
+        finally:
+            nym.pool = orig_pool
+    finally:
+        pool.stop()
+    assert set(pooled_ids) <= set(created)
+    assert pool.hits >= 2
+    assert pool.hits + pool.misses == 3
+    assert set(created) <= set(n._id for n in nym.get_all())
+
+
+@pytest.fixture()
+def idle_nym_pool():
+    '''Stop the workers of the session's nym pool during the test'''
+    size = nym.pool.size
+    nym.pool.stop()
+    yield
+    if size:
+        nym.pool.start(size)
+
+
+def test_nym_pool_retries(monkeypatch, idle_nym_pool):
+    '''A worker whose key generation failed keeps refilling the pool'''
+    create_nym = pyopentxs.otme.create_nym
+    results = ["", ""]
+    monkeypatch.setattr(nym, "otme", type("FailingOTME", (), {
+        "create_nym": staticmethod(lambda *args: results.pop() if results
+                                   else create_nym(*args))}))
+    pool = nym.NymPool()
+    pool.retry_interval = 0.01
+    pool.start(1)
+    try:
+        deadline = time.monotonic() + 10
+        while pool.available() < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        pool.stop()
+    assert pool.failures == 2
+    assert pool.available() == 1
+
+
 def test_check_nym():
     me = Nym().register()
     other = Nym().register()
@@ -0,0 +1,26 @@
+from pyopentxs.nym import Nym
+from pyopentxs.asset import Asset
+from pyopentxs import provision
+from pyopentxs.tests import data
+
+
+def test_provision():
+    btc = Asset().issue(Nym().register(), open(data.btc_contract_file))
+    silver = Asset().issue(Nym().register(), open(data.silver_contract_file))
+    rows = provision.provision(5, [btc, silver], {btc._id: 100}, workers=3)
+    assert provision.failed(rows) == []
+    for row in rows:
+        assert set(row.timings) == set(provision.STAGES)
+        assert row.accounts[btc._id].balance() == 100
+        assert row.accounts[silver._id].balance() == 0
+    assert btc.issuer_account.balance() == -500
+    assert set(provision.summary(rows)) == set(provision.STAGES)
+
+
+def test_provision_existing_nyms():
+    asset = Asset().issue(Nym().register(), open(data.btc_contract_file))
+    nyms = [Nym().create(), Nym().register()]
+    rows = provision.provision(nyms, [asset], {asset._id: 10})
+    assert [row.nym for row in rows] == nyms
+    assert provision.failed(rows) == []
+    assert [row.accounts[asset._id].balance() for row in rows] == [10, 10]
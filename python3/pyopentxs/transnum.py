@@ -0,0 +1,49 @@
+"""Transaction numbers are issued by the server to each nym and used up
+by every transaction.  The reservoir checks how many a nym has left on a
+server, which is a local call, and fetches a large batch when the count
+drops below a low watermark, so that the transactions themselves rarely
+have to wait for a round trip.
+"""
+
+from pyopentxs import otme, nym_lock
+import opentxs
+import threading
+
+
+class Reservoir:
+    '''Tops up the transaction numbers of a (server, nym) to high when
+       fewer than low would be left after a transaction.  refills counts
+       the top ups per (server id, nym id).'''
+
+    def __init__(self, low=10, high=50):
+        self.low = low
+        self.high = high
+        self.refills = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, server_id, nym_id, count=1):
+        '''Make sure the nym has at least low + count transaction numbers
+           on the server for an upcoming transaction.'''
+        key = (server_id, nym_id)
+        # the round trip to the server only holds up other requests of the nym
+        with nym_lock(server_id, nym_id):
+            # the wallet's count, numbers may have been used or burnt by
+            # the server without a reserve()
+            available = opentxs.OTAPI_Wrap_GetNym_TransactionNumCount(server_id, nym_id)
+            if available - count < self.low:
+                # a failure shows up in the transaction itself
+                otme.make_sure_enough_trans_nums(self.high + count, server_id, nym_id)
+                with self._lock:
+                    self.refills[key] = self.refills.get(key, 0) + 1
+
+    def total_refills(self):
+        with self._lock:
+            return sum(self.refills.values())
+
+
+# used by the instruments and market offers
+reservoir = Reservoir()
+
+
+def reserve(server_id, nym_id, count=1):
+    reservoir.reserve(server_id, nym_id, count)
@@ -0,0 +1,223 @@
+"""An in-memory index of the nyms, accounts and asset types in the
+wallet.  Enumerating the wallet through the API costs a call per entry,
+so it's done once; after that the index is kept up to date by pyopentxs
+as it creates and deletes entities, and lookups are dict lookups.
+
+parsed() reads the wallet.xml file itself, for what the API doesn't
+give access to, like the cached key.
+"""
+
+import pyopentxs
+from pyopentxs import message
+import functools
+import opentxs
+import threading
+
+
+class AccountInfo:
+    '''What the wallet knows about an account'''
+
+    def __init__(self, _id, server_id, nym_id, asset_id, name):
+        self._id = _id
+        self.server_id = server_id
+        self.nym_id = nym_id
+        self.asset_id = asset_id
+        self.name = name
+
+    def __repr__(self):
+        return "<AccountInfo id={}, server_id={}, nym_id={}, asset_id={}, name={!r}>".format(
+            self._id, self.server_id, self.nym_id, self.asset_id, self.name)
+
+
+def _account_info(account_id):
+    if hasattr(opentxs, 'OTAPI_Wrap_GetAccountWallet_InstrumentDefinitionID'):  # new api name
+        asset_id = opentxs.OTAPI_Wrap_GetAccountWallet_InstrumentDefinitionID(account_id)
+        server_id = opentxs.OTAPI_Wrap_GetAccountWallet_NotaryID(account_id)
+    else:  # todo: old api name, remove in due time
+        asset_id = opentxs.OTAPI_Wrap_GetAccountWallet_AssetTypeID(account_id)
+        server_id = opentxs.OTAPI_Wrap_GetAccountWallet_ServerID(account_id)
+    return AccountInfo(account_id, server_id,
+                       opentxs.OTAPI_Wrap_GetAccountWallet_NymID(account_id), asset_id,
+                       opentxs.OTAPI_Wrap_GetAccountWallet_Name(account_id))
+
+
+def _add_to(mapping, key, value):
+    mapping.setdefault(key, []).append(value)
+
+
+def _remove_from(mapping, key, value):
+    values = mapping.get(key, [])
+    if value in values:
+        values.remove(value)
+    if not values:
+        mapping.pop(key, None)
+
+
+class Index:
+    '''Nyms, accounts and asset types of the wallet by id and name, and the
+       accounts by nym and by asset type.  Loaded from the wallet on first
+       use.'''
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def _clear(self):
+        self.nyms = {}  # id -> name
+        self.nyms_by_name = {}
+        self.assets = {}  # id -> name
+        self.assets_by_name = {}
+        self.accounts = {}  # id -> AccountInfo
+        self.accounts_by_name = {}
+        self.accounts_by_nym = {}
+        self.accounts_by_asset = {}
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._clear()
+        for i in range(opentxs.OTAPI_Wrap_GetNymCount()):
+            self._add_nym(opentxs.OTAPI_Wrap_GetNym_ID(i))
+        for i in range(opentxs.OTAPI_Wrap_GetAssetTypeCount()):
+            self._add_asset(opentxs.OTAPI_Wrap_GetAssetType_ID(i))
+        for i in range(opentxs.OTAPI_Wrap_GetAccountCount()):
+            self._add_account(opentxs.OTAPI_Wrap_GetAccountWallet_ID(i))
+        self._loaded = True
+
+    def invalidate(self):
+        '''Reload from the wallet on next use'''
+        with self._lock:
+            self._loaded = False
+
+    def _add_nym(self, nym_id):
+        self._remove_nym(nym_id)
+        name = opentxs.OTAPI_Wrap_GetNym_Name(nym_id)
+        self.nyms[nym_id] = name
+        _add_to(self.nyms_by_name, name, nym_id)
+
+    def _remove_nym(self, nym_id):
+        if nym_id in self.nyms:
+            _remove_from(self.nyms_by_name, self.nyms.pop(nym_id), nym_id)
+
+    def _add_asset(self, asset_id):
+        self._remove_asset(asset_id)
+        name = opentxs.OTAPI_Wrap_GetAssetType_Name(asset_id)
+        self.assets[asset_id] = name
+        _add_to(self.assets_by_name, name, asset_id)
+
+    def _remove_asset(self, asset_id):
+        if asset_id in self.assets:
+            _remove_from(self.assets_by_name, self.assets.pop(asset_id), asset_id)
+
+    def _add_account(self, account_id):
+        self._remove_account(account_id)
+        info = self.accounts[account_id] = _account_info(account_id)
+        _add_to(self.accounts_by_name, info.name, account_id)
+        _add_to(self.accounts_by_nym, info.nym_id, account_id)
+        _add_to(self.accounts_by_asset, info.asset_id, account_id)
+
+    def _remove_account(self, account_id):
+        info = self.accounts.pop(account_id, None)
+        if info:
+            _remove_from(self.accounts_by_name, info.name, account_id)
+            _remove_from(self.accounts_by_nym, info.nym_id, account_id)
+            _remove_from(self.accounts_by_asset, info.asset_id, account_id)
+
+    def _update(self, f, _id):
+        # before the first load there is nothing to update
+        with self._lock:
+            if self._loaded:
+                f(_id)
+
+    # called by pyopentxs when it changes the wallet
+
+    def nym_changed(self, nym_id):
+        '''A nym was created or renamed'''
+        self._update(self._add_nym, nym_id)
+
+    def asset_changed(self, asset_id):
+        '''An asset type contract was created or added'''
+        self._update(self._add_asset, asset_id)
+
+    def account_changed(self, account_id):
+        '''An account was created'''
+        self._update(self._add_account, account_id)
+
+    def account_removed(self, account_id):
+        self._update(self._remove_account, account_id)
+
+    # lookups
+
+    def nym_ids(self):
+        with self._lock:
+            self._load()
+            return list(self.nyms)
+
+    def nym_name(self, nym_id):
+        '''Return the name of the nym, or None if it isn't in the wallet'''
+        with self._lock:
+            self._load()
+            return self.nyms.get(nym_id)
+
+    def nym_ids_by_name(self, name):
+        with self._lock:
+            self._load()
+            return list(self.nyms_by_name.get(name, []))
+
+    def asset_ids(self):
+        with self._lock:
+            self._load()
+            return list(self.assets)
+
+    def asset_name(self, asset_id):
+        '''Return the name of the asset type, or None if it isn't in the wallet'''
+        with self._lock:
+            self._load()
+            return self.assets.get(asset_id)
+
+    def asset_ids_by_name(self, name):
+        with self._lock:
+            self._load()
+            return list(self.assets_by_name.get(name, []))
+
+    def account_ids(self):
+        with self._lock:
+            self._load()
+            return list(self.accounts)
+
+    def account(self, account_id):
+        '''Return the AccountInfo of the account, or None if it isn't in the wallet'''
+        with self._lock:
+            self._load()
+            return self.accounts.get(account_id)
+
+    def account_ids_by_name(self, name):
+        with self._lock:
+            self._load()
+            return list(self.accounts_by_name.get(name, []))
+
+    def account_ids_of_nym(self, nym_id):
+        with self._lock:
+            self._load()
+            return list(self.accounts_by_nym.get(nym_id, []))
+
+    def account_ids_of_asset(self, asset_id):
+        with self._lock:
+            self._load()
+            return list(self.accounts_by_asset.get(asset_id, []))
+
+
+# the index of the wallet pyopentxs has loaded
+index = Index()
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_version(path, version):
+    return message.wallet_contents(pyopentxs.decode_file(path))
+
+
+def parsed(path=None):
+    '''Return the message.WalletContents of the client wallet (or the
+       wallet file at path), parsed again only when the file has changed'''
+    path = path or pyopentxs.config_dir + "client_data/wallet.xml"
+    return _parse_version(path, pyopentxs.file_version(path))
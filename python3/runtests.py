@@ -1,53 +1,45 @@
 #!/usr/bin/env python3
-import shutil
-import psutil
+import argparse
 import os
-import sys
 import pytest
 import pyopentxs
-from pyopentxs import notary
-import subprocess
-
-
-def create_fresh_ot_config():
-    # this creates fresh data in ../ot-clean-data/.ot
-    if os.path.exists(pyopentxs.config_dir):
-        shutil.rmtree(pyopentxs.config_dir)
-
-    # create a client wallet just for making the server contract
-    os.system("opentxs --dummy-passphrase changepw")
-
-    # create server contract and empty the client side data
-    setup_data = notary.setup(open('../test-data/sample-contracts/localhost.xml'), total_servers=2)
-    p = subprocess.Popen(["opentxs-notary", "--only-init"], stdin=subprocess.PIPE)
-    outs, errs = p.communicate(input=setup_data.getvalue(), timeout=20)
-
-
-def restart_opentxs_notary():
-    '''opentxs-notary must be on the PATH'''
-    # kill existing processes
-    for proc in psutil.process_iter():
-        if proc.name() == "opentxs-notary":
-            proc.kill()
-            psutil.wait_procs([proc], timeout=10)
-
-    create_fresh_ot_config()
-
-    # start new
-    os.system("opentxs-notary > opentxs-notary.log 2>&1 &")
-
-    # wait for ready
-    # doesn't seem to be necessary
-    # time.sleep(2)
-
-
-def fresh_setup():
-    restart_opentxs_notary()
-    pyopentxs.init()
+# fresh_setup and restart_opentxs_notary are also used by the notebooks
+from pyopentxs.localnet import fresh_setup  # noqa: F401
+from pyopentxs.localnet import restart_opentxs_notary, snapshot_root, stop_isolated, wait_for_notary
+import shutil
+import tempfile
 
 
 if __name__ == "__main__":
-    restart_opentxs_notary()
-    pyopentxs.init()
-    pytest.main(sys.argv[1:])
-    pyopentxs.cleanup()
+    parser = argparse.ArgumentParser(description="Run the tests against a fresh notary. "
+                                     "Other arguments are passed to py.test.")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="restore the ot config from a snapshot in {}".format(snapshot_root))
+    parser.add_argument("--snapshot-links", action="store_true",
+                        help="like --snapshot, but hardlink the snapshot files")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run the tests in this many processes (needs pytest-xdist), "
+                        "each with its own notary and client home")
+    args, pytest_args = parser.parse_known_args()
+    snapshot = args.snapshot or args.snapshot_links
+    if pyopentxs.backend == "simulated":
+        # there is no notary to set up
+        pyopentxs.init()
+        pytest.main(pytest_args)
+    elif args.workers:
+        # the workers set themselves up in the conftest.py session fixture
+        root = tempfile.mkdtemp(prefix="opentxs-tests-")
+        os.environ["PYOPENTXS_WORKER_ROOT"] = root
+        os.environ["PYOPENTXS_SNAPSHOT"] = \
+            "links" if args.snapshot_links else "copy" if snapshot else ""
+        try:
+            pytest.main(["-n", str(args.workers)] + pytest_args)
+        finally:
+            stop_isolated(root)
+            shutil.rmtree(root, ignore_errors=True)
+    else:
+        started = restart_opentxs_notary(snapshot, args.snapshot_links)
+        pyopentxs.init()
+        wait_for_notary(started)
+        pytest.main(pytest_args)
+        pyopentxs.cleanup()